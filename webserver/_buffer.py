@@ -0,0 +1,193 @@
+import threading
+import numpy as np
+from _helpers import find_timestamp_ranges
+
+
+class RingBuffer:
+    """
+    fixed-capacity sample buffer backed by preallocated numpy arrays
+    - samples are stored as float32 of shape (capacity, n_channels), timestamps as float64 (unix time)
+    - every sample is written twice (at pos and pos + capacity), so the latest n samples are always one contiguous slice
+      and can be handed out as zero-copy views without ever re-slicing or concatenating
+
+    appends are O(1) per sample, views are O(1), snapshots copy only the requested region
+    """
+
+    def __init__(self, n_channels:int, sfreq:float, max_seconds:float=180):
+        self.n_channels = int(n_channels)
+        self.sfreq = float(sfreq)
+        self.capacity = int(self.sfreq * max_seconds)
+
+        self._samples = np.zeros((2 * self.capacity, self.n_channels), dtype=np.float32)
+        self._timestamps = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._total = 0     # number of samples ever written, the write position is _total % capacity
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)     # notified by every write, see wait_for_timestamp()
+
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    @property
+    def total_written(self):
+        return self._total
+
+    @property
+    def seconds_filled(self):
+        return len(self) / self.sfreq
+
+
+    # --- writing (called from the ingestion thread)
+    def append(self, sample, timestamp:float):
+        with self._lock:
+            pos = self._total % self.capacity
+            self._samples[pos] = sample
+            self._samples[pos + self.capacity] = sample
+            self._timestamps[pos] = timestamp
+            self._timestamps[pos + self.capacity] = timestamp
+            self._total += 1
+            self._arrived.notify_all()
+
+    def extend(self, samples, timestamps):
+        """
+        appends a whole chunk of shape (n_samples, n_channels) - only the last `capacity` samples are kept if it is bigger
+        """
+
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1, self.n_channels)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = len(samples)
+
+        if n == 0:
+            return
+
+        with self._lock:
+            if n > self.capacity:
+                self._total += n - self.capacity
+                samples = samples[-self.capacity:]
+                timestamps = timestamps[-self.capacity:]
+                n = self.capacity
+
+            pos = self._total % self.capacity
+            first = min(n, self.capacity - pos)     # part until the end of the primary half, the rest wraps to the start
+
+            for offset in (0, self.capacity):
+                self._samples[offset + pos:offset + pos + first] = samples[:first]
+                self._timestamps[offset + pos:offset + pos + first] = timestamps[:first]
+                self._samples[offset:offset + n - first] = samples[first:]
+                self._timestamps[offset:offset + n - first] = timestamps[first:]
+
+            self._total += n
+            self._arrived.notify_all()
+
+
+    # --- waiting for data
+    @property
+    def latest_timestamp(self):
+        """
+        unix time of the newest sample, None while empty
+        """
+        with self._lock:
+            return self._latest_timestamp()
+
+    def _latest_timestamp(self):
+        if self._total == 0:
+            return None
+        return self._timestamps[(self._total - 1) % self.capacity]
+
+    def wait_for_timestamp(self, timestamp:float, timeout:float=None):
+        """
+        blocks until a sample at or after timestamp was written (woken by the ingestion thread, no polling)
+        returns False if that didn't happen within timeout seconds
+        """
+
+        with self._arrived:
+            return self._arrived.wait_for(
+                lambda: self._total > 0 and self._latest_timestamp() >= timestamp,
+                timeout=timeout,
+            )
+
+    def coverage(self, start_timestamp:float, end_timestamp:float):
+        """
+        fraction of the samples expected between start_timestamp and end_timestamp (at sfreq) that are in the buffer
+        - below 1 if samples got lost, arrived late or were already overwritten
+        """
+
+        expected = (end_timestamp - start_timestamp) * self.sfreq
+        if expected <= 0:
+            return 1.0
+
+        with self._lock:
+            start, end = self._span(self.capacity)
+            timestamps = self._timestamps[start:end]
+            n = np.searchsorted(timestamps, end_timestamp, side="left") - np.searchsorted(timestamps, start_timestamp, side="left")
+        return min(float(n) / expected, 1.0)
+
+
+    # --- reading
+    def _span(self, n_samples):
+        n = min(int(n_samples), len(self))
+        end = (self._total % self.capacity) + self.capacity
+        return end - n, end
+
+    def latest(self, n_samples:int=None):
+        """
+        zero-copy views (samples, timestamps) of the latest n samples (all available if None)
+        - the views are overwritten by the ingestion thread after another `capacity - n_samples` samples arrived,
+          so use snapshot() if the data has to outlive the current request
+        """
+
+        if n_samples is None:
+            n_samples = self.capacity
+
+        with self._lock:
+            start, end = self._span(n_samples)
+            return self._samples[start:end], self._timestamps[start:end]
+
+    def last_seconds(self, seconds:float):
+        """
+        zero-copy views of the latest `seconds` worth of samples
+        """
+        return self.latest(int(seconds * self.sfreq))
+
+    def since(self, index:int):
+        """
+        zero-copy views (samples, timestamps, start_index) of everything written from the absolute sample index on
+        - index counts all samples ever written (see total_written), so consumers can remember where they stopped
+        - start_index is bigger than index if the requested samples were already overwritten
+        """
+
+        with self._lock:
+            start_index = max(int(index), self._total - len(self))
+            start, end = self._span(self._total - start_index)
+            return self._samples[start:end], self._timestamps[start:end], start_index
+
+    def ranges(self, start_timestamps, seconds):
+        """
+        zero-copy views [(samples, timestamps), ...] of `seconds` from the sample closest to each start on
+        - all ranges are resolved with one searchsorted over the buffered timestamps, which are contiguous thanks to the
+          mirrored storage, so ranges across the wrap-around point are still single slices
+        - seconds is one duration for all ranges or one per range, ranges are cut by time (see find_timestamp_ranges),
+          so ones with missing samples or running past the newest sample are shorter
+        - like latest(), the views are overwritten once the ring wraps onto them
+        """
+
+        with self._lock:
+            if self._total == 0:
+                raise Exception("no samples in the buffer yet")
+
+            start, end = self._span(self.capacity)
+            samples, timestamps = self._samples[start:end], self._timestamps[start:end]
+            starts, ends = find_timestamp_ranges(timestamps, start_timestamps, seconds, self.sfreq)
+            return [(samples[s:e], timestamps[s:e]) for s, e in zip(starts, ends)]
+
+    def snapshot(self, n_samples:int=None):
+        """
+        consistent copy (samples, timestamps) of the latest n samples (all available if None)
+        """
+
+        if n_samples is None:
+            n_samples = self.capacity
+
+        with self._lock:
+            start, end = self._span(n_samples)
+            return self._samples[start:end].copy(), self._timestamps[start:end].copy()
@@ -0,0 +1,136 @@
+import collections
+import threading
+import time
+import traceback
+import numpy as np
+from pylsl import local_clock
+
+
+def measure_wall_offset(n_reads:int=5):
+    """
+    time.time() - local_clock(), from the tightest of n_reads brackets of local_clock() around time.time()
+    """
+
+    best = None
+    for _ in range(n_reads):
+        before = local_clock()
+        wall = time.time()
+        after = local_clock()
+        if best is None or after - before < best[0]:
+            best = (after - before, wall - (before + after) / 2)
+    return best[1]
+
+
+class ClockSync:
+    """
+    maps LSL timestamps of one inlet (the sender's clock) to unix time, with a model that follows clock drift
+    - a daemon thread measures offset = inlet.time_correction() + (time.time() - local_clock()) every interval seconds,
+      at sender time x = local_clock() - time_correction, and keeps the last max_points measurements
+    - offset(x) = intercept + slope * (x - center) is fitted by least squares, measurements further than
+      outlier_factor robust standard deviations (MAD) from the fit are dropped and the fit repeated
+    - the fit is replaced as a whole, to_unix() applies it to a chunk in one vectorized step from any thread
+    """
+
+    def __init__(self, inlet, interval:float=5.0, max_points:int=720, outlier_factor:float=3.0, min_tolerance:float=0.0005):
+        self.inlet = inlet
+        self.interval = interval
+        self.outlier_factor = outlier_factor
+        self.min_tolerance = min_tolerance      # seconds, residuals below this are never outliers
+
+        self.rejected = 0
+        self._time_correction = None
+        self._points = collections.deque(maxlen=max_points)    # (sender time, offset)
+        self._fit = None        # (center, intercept, slope, residual std of the kept points, n kept)
+        self._lock = threading.Lock()
+        self._stop_flag = threading.Event()
+        self._thread = None
+
+
+    def measure(self):
+        """
+        takes one measurement and refits - the first call blocks until LSL has its first time correction estimate
+        """
+
+        time_correction = self.inlet.time_correction()
+        wall_offset = measure_wall_offset()
+        sender_time = local_clock() - time_correction
+
+        with self._lock:
+            self._time_correction = time_correction
+            self._points.append((sender_time, time_correction + wall_offset))
+            points = np.array(self._points)
+        self._fit = self._fit_points(points)
+
+    def _fit_points(self, points):
+        x, y = points[:, 0], points[:, 1]
+        center = x.mean()
+        keep = np.ones(len(x), dtype=bool)
+
+        for _ in range(3):
+            if keep.sum() >= 2 and np.ptp(x[keep]) > 0:
+                slope, intercept = np.polyfit(x[keep] - center, y[keep], 1)
+            else:
+                slope, intercept = 0.0, float(np.median(y[keep]))
+
+            residuals = y - (intercept + slope * (x - center))
+            tolerance = max(self.outlier_factor * 1.4826 * np.median(np.abs(residuals[keep])), self.min_tolerance)
+            new_keep = np.abs(residuals) <= tolerance
+            if np.array_equal(new_keep, keep) or new_keep.sum() == 0:
+                break
+            keep = new_keep
+
+        self.rejected = int((~keep).sum())
+        return (center, float(intercept), float(slope), float(residuals[keep].std()), int(keep.sum()))
+
+
+    def offset(self, sender_time:float=None):
+        """
+        seconds to add to an LSL timestamp to get unix time (at the current time if sender_time is None)
+        """
+
+        fit = self._fit
+        if fit is None:
+            return None
+        if sender_time is None:
+            sender_time = local_clock() - self._time_correction
+        center, intercept, slope, _, _ = fit
+        return intercept + slope * (sender_time - center)
+
+    def to_unix(self, timestamps:np.ndarray):
+        center, intercept, slope, _, _ = self._fit
+        return timestamps + intercept + slope * (timestamps - center)
+
+    def stats(self):
+        fit = self._fit
+        if fit is None:
+            return None
+        center, intercept, slope, residual_std, n_kept = fit
+        return {
+            "offset": self.offset(),
+            "drift_ppm": slope * 1e6,
+            "residual_ms": residual_std * 1000,
+            "points": n_kept,
+            "rejected": self.rejected,
+        }
+
+
+    def start(self):
+        """
+        takes the first measurement right away (so to_unix() works from the first chunk on) and then keeps measuring
+        """
+
+        self.measure()
+        self._thread = threading.Thread(target=self._run, name="clock-sync")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_flag.set()
+
+    def _run(self):
+        while not self._stop_flag.wait(self.interval):
+            try:
+                self.measure()
+            except Exception:
+                print("--- clock sync measurement failed, keeping the last fit ---")
+                traceback.print_exc()
@@ -0,0 +1,266 @@
+import copy
+import glob
+import os
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.kernel_approximation import RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC
+from _features import focus_features
+from _registry import ModelRegistry
+from _store import FeatureStore
+
+
+class IncrementalSVC(SVC):
+    def __init__(self, C=1.0, kernel='rbf', degree=3, gamma='scale',
+                 coef0=0.0, shrinking=True, probability=False,
+                 tol=1e-3, cache_size=200, class_weight=None,
+                 verbose=False, max_iter=-1, decision_function_shape='ovr',
+                 break_ties=False, random_state=None):
+
+        super().__init__(
+            C=C, kernel=kernel, degree=degree, gamma=gamma,
+            coef0=coef0, shrinking=shrinking, probability=probability,
+            tol=tol, cache_size=cache_size, class_weight=class_weight,
+            verbose=verbose, max_iter=max_iter,
+            decision_function_shape=decision_function_shape,
+            break_ties=break_ties, random_state=random_state
+        )
+        self.X_train = None
+        self.y_train = None
+
+    def partial_fit(self, X, y, classes=None):
+        """Incrementally fit the model by storing all data and retraining."""
+        # First time training
+        if self.X_train is None:
+            self.X_train = X.copy()
+            self.y_train = y.copy()
+        else:
+            # Append new data
+            self.X_train = np.vstack((self.X_train, X))
+            self.y_train = np.append(self.y_train, y)
+
+        # Retrain on all data
+        super().fit(self.X_train, self.y_train)
+        return self
+
+
+class OnlineFocusClassifier(ClassifierMixin, BaseEstimator):
+    """
+    truly incremental replacement for IncrementalSVC - approximate RBF kernel (random fourier features) + logistic
+    regression trained with SGD, so predict_proba works like on the SVC
+    - partial_fit only trains on the new batch plus a fixed size reservoir sample of everything seen before (against
+      forgetting), update time depends on the batch size and memory is bounded by n_components and replay_size
+    - gamma=None picks it like SVC(gamma='scale') from the first batch
+    """
+
+    def __init__(self, n_components=1024, gamma=None, alpha=1e-4, n_epochs=5, replay_size=512, random_state=0):
+        self.n_components = n_components
+        self.gamma = gamma
+        self.alpha = alpha
+        self.n_epochs = n_epochs
+        self.replay_size = replay_size
+        self.random_state = random_state
+
+
+    def _start(self, X, classes):
+        gamma = self.gamma or 1.0 / (X.shape[1] * X.var())
+        self.sampler_ = RBFSampler(gamma=gamma, n_components=self.n_components, random_state=self.random_state).fit(X)
+        self.sgd_ = SGDClassifier(loss="log_loss", alpha=self.alpha, random_state=self.random_state)
+        self.classes_ = np.array([0, 1]) if classes is None else np.asarray(classes)
+
+        self.replay_x_ = np.zeros((self.replay_size, X.shape[1]))
+        self.replay_y_ = np.zeros(self.replay_size, dtype=self.classes_.dtype)
+        self.n_seen_ = 0
+        self.seen_sessions_ = set()     # calibration sessions already trained on, see finetune_focus
+        self._rng = np.random.default_rng(self.random_state)
+
+    def _remember(self, X, y):
+        """
+        reservoir sampling - every sample seen so far has the same chance to be in the replay buffer
+        """
+
+        for x_i, y_i in zip(X, y):
+            if self.n_seen_ < self.replay_size:
+                slot = self.n_seen_
+            else:
+                slot = self._rng.integers(0, self.n_seen_ + 1)
+            if slot < self.replay_size:
+                self.replay_x_[slot] = x_i
+                self.replay_y_[slot] = y_i
+            self.n_seen_ += 1
+
+
+    def partial_fit(self, X, y, classes=None):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        if not hasattr(self, "sgd_"):
+            self._start(X, classes)
+
+        n_replay = min(self.n_seen_, self.replay_size)
+        features = self.sampler_.transform(np.concatenate([X, self.replay_x_[:n_replay]]))
+        labels = np.concatenate([y, self.replay_y_[:n_replay]])
+
+        for _ in range(self.n_epochs):
+            order = self._rng.permutation(len(labels))
+            self.sgd_.partial_fit(features[order], labels[order], classes=self.classes_)
+
+        self._remember(X, y)
+        return self
+
+    def fit(self, X, y):
+        for attribute in ("sgd_", "sampler_"):
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        return self.partial_fit(X, y, classes=np.unique(y))
+
+    def predict_proba(self, X):
+        return self.sgd_.predict_proba(self.sampler_.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# --- focus finetuning, runs in a worker process (see Jobs in _jobs.py), so nothing here may touch the serving state
+focus_data_dir = "./collected_data/focus"   # {idx}_focused.npy / {idx}_unfocused.npy of shape (7, 40 * sfreq)
+
+
+def load_focus_sessions(data_dir:str=focus_data_dir):
+    """
+    {session idx: (focused path, unfocused path)} of all saved calibrations that have both halves, oldest first
+    """
+
+    sessions = {}
+    for path in glob.glob(os.path.join(data_dir, "*_focused.npy")):
+        idx = os.path.basename(path)[:-len("_focused.npy")]
+        unfocused_path = os.path.join(data_dir, f"{idx}_unfocused.npy")
+        if os.path.exists(unfocused_path):
+            sessions[idx] = (path, unfocused_path)
+
+    return dict(sorted(sessions.items(), key=lambda item: int(item[0]) if item[0].isdigit() else item[0]))
+
+
+def sessions_to_dataset(sessions:dict, sfreq=128, store:FeatureStore=None):
+    """
+    focus features of every 1s step of every recording - returns (x, y with 1 = focused, session index per row)
+    - read from the feature store where the recording was stored, only the rest gets recomputed from the raw file
+    """
+
+    x, y, groups = [], [], []
+    for group, paths in enumerate(sessions.values()):
+        for path, label in zip(paths, (1, 0)):
+            features = store.source_features("focus", os.path.basename(path)) if store else None
+            if features is None:
+                features = focus_features(np.load(path), sfreq)
+            x.append(features)
+            y.append(np.full(len(features), label))
+            groups.append(np.full(len(features), group))
+
+    return np.concatenate(x), np.concatenate(y), np.concatenate(groups)
+
+
+def finetune_focus(scaler, baseline, models_dir:str, data_dir:str=focus_data_dir, sfreq=128, test_size=0.2, method="refit",
+                   store_root:str=None):
+    """
+    fits a new focus model on the saved calibrations and publishes it to the registry if it does at least as well
+    as the serving one (baseline) on held-out data - the scaler stays the same, so only "focus_svm" changes
+    - method "refit" fits a fresh copy of the serving model on everything, "online" continues an OnlineFocusClassifier
+      (or starts one) with partial_fit on the sessions it hasn't seen yet - if those are all held out, the current
+      model is scored on them before it learns them (prequential)
+    - features come from the FeatureStore at store_root where available
+    - with several sessions the newest one is held out, otherwise the last test_size of each recording
+      (neighbouring 1s steps share 14s of their window, a random split would leak)
+    - the held-out data only decides whether to publish, a published model has been trained on it as well
+    - returns a JSON serializable summary for the job status
+    """
+
+    sessions = load_focus_sessions(data_dir)
+    if not sessions:
+        raise Exception(f"no calibration recordings in {data_dir}")
+
+    x, y, groups = sessions_to_dataset(sessions, sfreq, FeatureStore(store_root) if store_root else None)
+    x = scaler.transform(x)
+
+    if len(sessions) > 1:
+        test = groups == groups.max()
+    else:
+        test = np.zeros(len(y), dtype=bool)
+        for label in (0, 1):
+            rows = np.where(y == label)[0]
+            test[rows[len(rows) - max(1, int(len(rows) * test_size)):]] = True
+
+    if method == "online":
+        clf = copy.deepcopy(baseline) if isinstance(baseline, OnlineFocusClassifier) else OnlineFocusClassifier()
+        names = np.array(list(sessions))
+        unseen = ~np.isin(names[groups], list(getattr(clf, "seen_sessions_", ())))
+        if not unseen.any():
+            raise Exception("no new calibration sessions for the online model")
+        
+        if (unseen & ~test).any():
+            clf.partial_fit(x[unseen & ~test], y[unseen & ~test], classes=np.array([0, 1]))
+    elif method == "refit":
+        # same hyperparameters as the serving model
+        clf = clone(baseline)
+        clf.fit(x[~test], y[~test])
+    else:
+        raise Exception(f"unknown finetuning method {method}, expected refit or online")
+
+    accuracy = float(clf.score(x[test], y[test]))
+    baseline_accuracy = float(baseline.score(x[test], y[test]))
+
+    version = None
+    if accuracy >= baseline_accuracy:
+        # the newest calibration is what the user just recorded to adapt the model, so it can't stay held out
+        if method == "refit":
+            clf = clone(baseline).fit(x, y)
+        else:
+            if (unseen & test).any():
+                clf.partial_fit(x[unseen & test], y[unseen & test], classes=np.array([0, 1]))
+            clf.seen_sessions_.update(names[np.unique(groups[unseen])])
+        version = ModelRegistry(models_dir).publish("focus_svm", clf, ".pkl")
+
+    return {
+        "sessions": len(sessions),
+        "train_samples": int((~test).sum()),
+        "test_samples": int(test.sum()),
+        "accuracy": accuracy,
+        "baseline_accuracy": baseline_accuracy,
+        "published_version": version,
+    }
+
+
+# update time, accuracy and memory of IncrementalSVC vs OnlineFocusClassifier over a growing number of calibrations
+if __name__ == "__main__":
+    import time
+    from sklearn.datasets import make_classification
+
+    n_batches = 40
+    batch_size = 52     # one calibration: 26 focused + 26 unfocused steps
+    n_features = 252    # 7 channels * 36 bins
+
+    x, y = make_classification(n_samples=(n_batches + 10) * batch_size, n_features=n_features, n_informative=30,
+                               n_redundant=20, class_sep=0.8, flip_y=0.05, random_state=0)
+    x_test, y_test = x[n_batches * batch_size:], y[n_batches * batch_size:]
+
+    models = {
+        "IncrementalSVC": IncrementalSVC(probability=True, random_state=0),
+        "OnlineFocusClassifier": OnlineFocusClassifier(),
+    }
+
+    for name, model in models.items():
+        times = []
+        for batch in range(n_batches):
+            rows = slice(batch * batch_size, (batch + 1) * batch_size)
+            start = time.perf_counter()
+            model.partial_fit(x[rows], y[rows], classes=np.array([0, 1]))
+            times.append(time.perf_counter() - start)
+
+            if batch + 1 in (1, 10, n_batches):
+                print(f"{name:<22} after {batch + 1:>2} batches: update {times[-1] * 1000:7.1f} ms, "
+                      f"accuracy {model.score(x_test, y_test):.3f}")
+
+        if isinstance(model, IncrementalSVC):
+            memory = model.X_train.nbytes + model.support_vectors_.nbytes
+        else:
+            memory = model.replay_x_.nbytes + model.sampler_.random_weights_.nbytes + model.sgd_.coef_.nbytes
+        print(f"{name:<22} total update time {sum(times):.2f}s, training state {memory / 1024**2:.2f} MB")
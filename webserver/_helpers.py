@@ -1,54 +1,41 @@
+import numpy as np
+
+
 def softmax(x):
     exp_x = np.exp(x - np.max(x, axis=1, keepdims=True))
     return exp_x / np.sum(exp_x, axis=1, keepdims=True)
 
 
 
-def find_closest_timestamp_index(timestamps:list, target_timestamp):
+def find_closest_timestamp_indices(timestamps:np.ndarray, target_timestamps):
     """
-    Finds the index of the closest timestamp to the target timestamp.
-    Uses binary search for efficiency.
-    
-    Args:
-        timestamps: List of timestamps (assumed to be sorted)
-        target_timestamp: The timestamp to find
-        
-    Returns:
-        Index of the closest timestamp
+    index of the closest timestamp for every target at once (one searchsorted), timestamps have to be sorted
+    - targets before the first or after the last timestamp get the first / last index, ties go to the later sample
     """
-    if not timestamps:
-        raise ValueError("Empty timestamps list")
-    
-    # Binary search for the closest value
-    left, right = 0, len(timestamps) - 1
     
-    # Handle edge cases
-    if target_timestamp <= timestamps[0]:
-        return 0
-    if target_timestamp >= timestamps[-1]:
-        print(f"timestep {target_timestamp} received from frontend, is bigger than the latest timestamp {timestamps[-1]}")
-        return len(timestamps) - 1
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    targets = np.atleast_1d(np.asarray(target_timestamps, dtype=np.float64))
+    if len(timestamps) == 0:
+        raise ValueError("Empty timestamps list")
+    if len(timestamps) == 1:
+        return np.zeros(len(targets), dtype=np.int64)
     
-    # Binary search
-    while left <= right:
-        mid = (left + right) // 2
-        
-        if timestamps[mid] == target_timestamp:
-            return mid
-        
-        if timestamps[mid] < target_timestamp:
-            left = mid + 1
-        else:
-            right = mid - 1
+    right = np.clip(np.searchsorted(timestamps, targets), 1, len(timestamps) - 1)
+    left = right - 1
+    return np.where(np.abs(timestamps[left] - targets) < np.abs(timestamps[right] - targets), left, right)
+
+
+def find_timestamp_ranges(timestamps:np.ndarray, start_timestamps, seconds, sfreq:float):
+    """
+    (start indices, end indices) of `seconds` from the sample closest to every start timestamp on - seconds is one
+    duration for all or one per start
+    - cut by time, not by sample count: a range with missing samples comes out shorter instead of running on past its end
+    - the end is exclusive, half a sample before start + seconds, so a range without gaps holds exactly
+      round(seconds * sfreq) samples even with some jitter (and never more), cut off at the end of timestamps
+    """
     
-    # At this point, left > right
-    # Return the closest of timestamps[right] and timestamps[left]
-    if left >= len(timestamps):
-        return right
-    if right < 0:
-        return left
-        
-    if abs(timestamps[right] - target_timestamp) < abs(timestamps[left] - target_timestamp):
-        return right
-    else:
-        return left
\ No newline at end of file
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    starts = find_closest_timestamp_indices(timestamps, start_timestamps)
+    ends = np.searchsorted(timestamps, timestamps[starts] + seconds - 0.5 / sfreq)
+    return starts, np.clip(ends, starts, starts + np.round(seconds * sfreq).astype(np.int64))
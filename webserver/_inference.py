@@ -0,0 +1,102 @@
+import threading
+import time
+import traceback
+
+
+class LatestResults:
+    """
+    thread-safe store of the newest prediction per model
+    - every publish bumps a version counter and wakes up everyone waiting in wait_for_update()
+    """
+
+    def __init__(self):
+        self._results = {}  # name -> {"value": ..., "timestamp": unix time of the prediction, "version": version it was published in}
+        self._version = 0
+        self._condition = threading.Condition()
+
+
+    @property
+    def version(self):
+        return self._version
+
+    def publish(self, name:str, value):
+        with self._condition:
+            self._version += 1
+            self._results[name] = {"value": value, "timestamp": time.time(), "version": self._version}
+            self._condition.notify_all()
+
+    def get(self, name:str):
+        """
+        (value, age in seconds) - (None, None) if nothing was published yet
+        """
+        with self._condition:
+            result = self._results.get(name)
+
+        if result is None:
+            return None, None
+        return result["value"], time.time() - result["timestamp"]
+
+    def published_since(self, version:int):
+        """
+        {name: (value, age in seconds)} of everything published after version, together with the current version
+        """
+        with self._condition:
+            now = time.time()
+            changed = {
+                name: (result["value"], now - result["timestamp"])
+                for name, result in self._results.items() if result["version"] > version
+            }
+            return changed, self._version
+
+    def wait_for_update(self, version:int, timeout:float=None):
+        """
+        blocks until something newer than version was published (or timeout) - returns the current version
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout=timeout)
+            return self._version
+
+
+class InferenceScheduler:
+    """
+    runs every registered model in its own daemon thread at its own cadence and publishes into a LatestResults store
+    - a task is a function without arguments returning the prediction, or None if there is not enough data yet
+    - a slow model only delays itself, the HTTP handlers just read the store
+    """
+
+    def __init__(self, results:LatestResults):
+        self.results = results
+        self._tasks = []
+        self._stop_flag = threading.Event()
+        self._threads = []
+
+
+    def add_task(self, name:str, task, interval:float):
+        self._tasks.append((name, task, float(interval)))
+
+    def start(self):
+        for name, task, interval in self._tasks:
+            thread = threading.Thread(target=self._run, args=(name, task, interval), name=f"inference-{name}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop_flag.set()
+
+
+    def _run(self, name, task, interval):
+        next_run = time.perf_counter()
+
+        while not self._stop_flag.is_set():
+            try:
+                value = task()
+                if value is not None:
+                    self.results.publish(name, value)
+            except Exception:
+                print(f"--- inference task {name} failed ---")
+                traceback.print_exc()
+
+            # fixed cadence, but never try to catch up on missed runs if a prediction took longer than the interval
+            next_run = max(next_run + interval, time.perf_counter())
+            self._stop_flag.wait(next_run - time.perf_counter())
@@ -0,0 +1,92 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import BrokenExecutor
+
+
+class Jobs:
+    """
+    background jobs on an executor (process or thread pool) with a status per job id, for the frontend to poll
+    - status goes queued -> running -> done / failed, results have to be JSON serializable for the routes
+    - only the newest max_jobs finished jobs are remembered
+    - make_executor creates the executor, and again if a crashed worker process broke the old one
+    """
+
+    def __init__(self, make_executor, max_jobs:int=100):
+        self.make_executor = make_executor
+        self.executor = make_executor()
+        self.max_jobs = max_jobs
+        self._jobs = {}     # job id -> {"name", "status", "submitted", "finished", "result", "error"}, insertion ordered
+        self._futures = {}
+        self._lock = threading.Lock()
+
+
+    def submit(self, name:str, fn, *args, **kwargs):
+        """
+        runs fn(*args, **kwargs) on the executor - returns the job id
+        """
+
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {"id": job_id, "name": name, "status": "queued", "submitted": time.time(),
+                                  "finished": None, "result": None, "error": None}
+            self._forget_old()
+
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BrokenExecutor:
+            print("--- executor broke, starting a new one ---")
+            self.executor = self.make_executor()
+            future = self.executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda future: self._finish(job_id, future))
+        return job_id
+
+    def status(self, job_id:str):
+        """
+        copy of the job's status dict - None for unknown ids
+        """
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            future = self._futures.get(job_id)
+            if job["status"] == "queued" and future is not None and future.running():
+                job["status"] = "running"
+            return dict(job)
+
+    def shutdown(self, wait:bool=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            self._futures.pop(job_id, None)
+            if job is None:
+                return
+
+            job["finished"] = time.time()
+            if future.cancelled():
+                job["status"] = "failed"
+                job["error"] = "cancelled"
+            elif future.exception() is not None:
+                job["status"] = "failed"
+                job["error"] = str(future.exception())
+            else:
+                job["status"] = "done"
+                job["result"] = future.result()
+
+        if job is not None and job["status"] == "failed":
+            print(f"--- job {job['name']} ({job_id}) failed ---")
+            if not future.cancelled() and future.exception() is not None:
+                traceback.print_exception(future.exception())
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self._jobs[job_id]
@@ -0,0 +1,175 @@
+import bisect
+import math
+import threading
+import time
+
+
+# seconds, from 100µs (ring buffer writes) to 2.5s (a stalled model run)
+default_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Counter:
+    """
+    either inc() from the outside, or fn returns a count something else keeps (f.e. the stream monitor's gaps)
+    """
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+        self._lock = threading.Lock()
+
+    def inc(self, amount:float=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name:str, labels:str):
+        return [(name + "_total", labels, _call(self.fn) if self.fn is not None else self.value)]
+
+
+class Gauge:
+    """
+    either set() from the outside, or fn is called whenever the metrics are rendered (f.e. buffer fill)
+    """
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value:float):
+        self.value = value
+
+    def samples(self, name:str, labels:str):
+        return [(name, labels, _call(self.fn) if self.fn is not None else self.value)]
+
+
+class Histogram:
+    """
+    counts per bucket, cumulative only when rendered - observe() is a bisect and three additions under a lock
+    """
+
+    def __init__(self, buckets:tuple=default_buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value:float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name:str, labels:str):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+
+        samples = []
+        cumulative = 0
+        for le, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = "+Inf" if le == math.inf else repr(le)
+            samples.append((name + "_bucket", _join_labels(labels, f'le="{le}"'), cumulative))
+        samples.append((name + "_sum", labels, total))
+        samples.append((name + "_count", labels, cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram:Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def _call(fn):
+    # a metric that can't be computed right now (f.e. no stream yet) is rendered as NaN
+    try:
+        value = fn()
+    except Exception:
+        value = None
+    return math.nan if value is None else value
+
+def _join_labels(*labels):
+    return ",".join(label for label in labels if label)
+
+
+class Metrics:
+    """
+    counters, gauges and histograms by name and labels, rendered in the Prometheus text format for /metrics
+    - histogram(), counter() and gauge() return the same object for the same name and labels,
+      so they can be looked up once at import and then be used from any thread
+    """
+
+    def __init__(self):
+        self._families = {}     # name -> (type, help, {labels string: metric}), insertion ordered
+        self._lock = threading.Lock()
+
+
+    def _get(self, kind:str, name:str, help:str, labels:dict, make):
+        labels = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise Exception(f"metric {name} is already a {family[0]}, not a {kind}")
+            if labels not in family[2]:
+                family[2][labels] = make()
+            return family[2][labels]
+
+    def counter(self, name:str, help:str="", fn=None, **labels):
+        counter = self._get("counter", name, help, labels, Counter)
+        if fn is not None:
+            counter.fn = fn
+        return counter
+
+    def gauge(self, name:str, help:str="", fn=None, **labels):
+        gauge = self._get("gauge", name, help, labels, Gauge)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name:str, help:str="", buckets:tuple=default_buckets, **labels):
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+
+    def render(self):
+        with self._lock:
+            families = [(name, kind, help, list(children.items())) for name, (kind, help, children) in self._families.items()]
+
+        lines = []
+        for name, kind, help, children in families:
+            family_name = name + "_total" if kind == "counter" else name    # the same name as the counter's samples
+            if help:
+                lines.append(f"# HELP {family_name} {help}")
+            lines.append(f"# TYPE {family_name} {kind}")
+            for labels, metric in children:
+                for sample_name, sample_labels, value in metric.samples(name, labels):
+                    lines.append(f"{sample_name}{{{sample_labels}}} {_format(value)}" if sample_labels else f"{sample_name} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# one instance for the whole process, the pipeline modules register their metrics at import
+metrics = Metrics()
+
+
+def stage_time(stage:str):
+    """
+    histogram of one pipeline stage (ingest, downsample, features, model run, serialization), used as `with stage_time(...).time():`
+    """
+    return metrics.histogram("pipeline_stage_seconds", "seconds per call of each pipeline stage", stage=stage)
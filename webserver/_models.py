@@ -1,49 +1,54 @@
-from torcheeg import transforms
-import onnxruntime as ort
+import threading
 import numpy as np
-from scipy.signal import windows
-from sklearn.model_selection import train_test_split
-from sklearn.svm import SVC
+from numpy.lib.stride_tricks import sliding_window_view
 import joblib
 import os
+from _features import focus_features
+from _helpers import softmax
+from _cwt import cwt_spectrum
+from _onnx import OnnxModel
+from _registry import ModelRegistry
+from _metrics import stage_time
+
+
+# --- registry
+# new versions dropped into models_dir (f.e. by finetuning) are swapped in while serving, see _registry.py
+models_dir = os.getenv("MODELS_DIR", "./models")
+registry = ModelRegistry(models_dir, poll_interval=float(os.getenv("MODELS_POLL_INTERVAL", 2.0)))
 
 
 # --- cogload model
 onnx_path = "./inference.onnx"
+benchmark_runs = int(os.getenv("COGLOAD_BENCHMARK_RUNS", 20))     # 0 skips the startup benchmark
 
 if not os.path.exists(onnx_path):
     raise FileNotFoundError("need /webserver/inference.onnx file with model")
 
-session_options = ort.SessionOptions()
-session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] # fallbacks to CPU if CUDA isn't available
 
+cogload_run_time = stage_time("cogload_model")
 
-session = ort.InferenceSession(
-    onnx_path,
-    sess_options=session_options,
-    providers=providers
-)
 
+def load_cogload_model(path:str):
+    # session options, providers, variant and optimized model cache come from .env (see _onnx.py)
+    # the variant only picks between the files next to inference.onnx, registry versions are loaded as they are
+    model = OnnxModel.from_env(path, variant=None if path == onnx_path else "fp32")
+    
+    print("input_name: ", model.input_name)
+    print("output_name: ", model.output_name)
+    print(f"cogload model: {model.path} on {model.session.get_providers()}, loaded in {model.load_time:.2f}s")
+    
+    if benchmark_runs > 0:
+        latency = model.benchmark(benchmark_runs)
+        print(f"cogload model latency: p50 {latency['p50']:.1f} ms, p99 {latency['p99']:.1f} ms")
+    return model
 
-input_name = session.get_inputs()[0].name
-output_name = session.get_outputs()[0].name
 
-print("input_name: ", input_name)
-print("output_name: ", output_name)
+cogload_model = registry.register("cogload", load_cogload_model, onnx_path, ".onnx")
 
 
 # --- preprocessing and interface
-
-# has to match the data we give into the    
-offline_transform = transforms.Compose([
-    transforms.CWTSpectrum(
-        wavelet='morl',
-        total_scale=64,
-        contourf=False
-    ),
-    transforms.MeanStdNormalize(),
-])
+# the wavelet transform has to match torcheeg's CWTSpectrum(wavelet='morl', total_scale=64) + MeanStdNormalize
+# which the model was trained with - _cwt.py reimplements it in numpy, so torch is never imported at runtime
 
 
 def predict_cogload(raw_data:np.ndarray, sfreq=128):
@@ -51,17 +56,58 @@ def predict_cogload(raw_data:np.ndarray, sfreq=128):
     expects 4s raw array chunk with 7 channels on 128 sampling frequency - shape: (14, 512)
     """
     
-    input_data = offline_transform(eeg=raw_data)["eeg"]
+    input_data = cwt_spectrum(raw_data)
+    return predict_cogload_transformed(input_data)
+
+
+def predict_cogload_transformed(input_data:np.ndarray):
+    """
+    expects an already transformed 4s window - shape: (7, 64, 512), f.e. from cwt_spectrum
+    """
+    
     input_data = np.array([input_data], dtype=np.float32) 
 
-    onnx_outputs = session.run([output_name], {input_name: input_data})
-    probs = onnx_outputs[0]
+    with cogload_run_time.time():
+        probs = cogload_model.get().run(input_data)
     return probs
 
 
+def predict_cogload_batch(raw_data:np.ndarray, sfreq=128, window_seconds=4, hop_seconds=0.5, batch_size=64):
+    """
+    scores all overlapping windows of a longer raw chunk (f.e. the last 30s, or a whole recording) - shape: (7, n_samples)
+    - windows of window_seconds every hop_seconds are transformed and sent through the model batch_size at a time
+    - returns (probabilities of high cognitive load of shape (n_windows,), start sample of each window)
+    """
+    
+    window_samples = int(window_seconds * sfreq)
+    hop_samples = max(int(hop_seconds * sfreq), 1)
+    
+    if raw_data.shape[1] < window_samples:
+        return np.zeros(0), np.zeros(0, dtype=int)
+    
+    windows = sliding_window_view(raw_data, window_samples, axis=1)[:, ::hop_samples]   # (channels, n_windows, samples)
+    n_windows = windows.shape[1]
+    starts = np.arange(n_windows) * hop_samples
+    
+    probs = np.zeros(n_windows)
+    batch = None
+    for batch_start in range(0, n_windows, batch_size):
+        batch_end = min(batch_start + batch_size, n_windows)
+        
+        for i in range(batch_start, batch_end):
+            transformed = cwt_spectrum(windows[:, i])
+            if batch is None:
+                batch = np.zeros((batch_size,) + transformed.shape, dtype=np.float32)
+            batch[i - batch_start] = transformed
+        
+        onnx_outputs = cogload_model.get().run(batch[:batch_end - batch_start])
+        probs[batch_start:batch_end] = softmax(onnx_outputs)[:, 1]
+    
+    return probs, starts
+
+
 # --- focus model
-svm_path = "./svm_0.pkl"    # focus vs rest
-svm_path_dirty = "./dirty_svm_0.pkl"
+svm_path = "./svm_0.pkl"    # focus vs rest, finetuned versions are published to the registry as "focus_svm"
 scaler_path = "./scaler.pkl"
 
 
@@ -70,183 +116,84 @@ if not os.path.exists(svm_path):
 
 if not os.path.exists(scaler_path):
     raise FileNotFoundError("need /webserver/scaler.pkl file with model")
-        
-scaler = joblib.load(scaler_path)
 
-if os.path.exists(svm_path_dirty):
-    clf = joblib.load(svm_path_dirty)
-else:
-    clf = joblib.load(svm_path)
+
+scaler = registry.register("scaler", joblib.load, scaler_path, ".pkl")
+clf = registry.register("focus_svm", joblib.load, svm_path, ".pkl")
+focus_run_time = stage_time("focus_model")
 
 def predict_focus(raw_data: np.ndarray, sfreq=128):
     """
     expects 15s raw array chunk with 7 channels on 128 sampling frequency - shape: (14, 1920)
     """
     
-    # --- CLAUDE rewrite of MNE implementation from train_focus.ipynb
-    window_length = 15  # seconds
-    step_size = 1  # second
-    
-    # Convert to samples
-    window_samples = int(window_length * sfreq)
-    step_samples = int(step_size * sfreq)
-    
-    # Create Blackman window
-    blackman_window = windows.blackman(window_samples)
-    
-    # Calculate number of windows
-    n_windows = (raw_data.shape[1] - window_samples) // step_samples + 1
-    
-    # Prepare for STFT
-    n_channels = raw_data.shape[0]
-    n_fft = 1024
-    
-    # Initialize spectrogram array
-    spectrograms = np.zeros((n_channels, n_windows, n_fft//2 + 1))
-    
-    # Calculate STFT for each channel
-    for ch_idx in range(n_channels):
-        for win_idx in range(n_windows):
-            # Extract window
-            start_idx = win_idx * step_samples
-            end_idx = start_idx + window_samples
-            window_data = raw_data[ch_idx, start_idx:end_idx]
-            
-            # Apply Blackman window
-            windowed_data = window_data * blackman_window
-            
-            # Calculate FFT
-            fft_result = np.fft.rfft(windowed_data, n=n_fft)
-            
-            # Calculate power spectrum
-            power_spectrum = np.abs(fft_result)**2
-            
-            # Store in spectrogram
-            spectrograms[ch_idx, win_idx, :] = power_spectrum
-    
-    # Calculate frequency bins
-    freqs = np.fft.rfftfreq(n_fft, d=1/sfreq)
-    
-    # Bin into 0.5 Hz bands (from 0 to 18 Hz)
-    bin_size = 0.5
-    max_freq = 18.0
-    n_bins = int(max_freq / bin_size)
-    
-    binned_spectrograms = np.zeros((n_channels, n_windows, n_bins))
-    
-    # Fixed binning approach
-    for ch_idx in range(n_channels):
-        for win_idx in range(n_windows):
-            for bin_idx in range(n_bins):
-                freq_start = bin_idx * bin_size
-                freq_end = (bin_idx + 1) * bin_size
-                
-                # Find indices of frequencies in this bin
-                bin_indices = np.where((freqs >= freq_start) & (freqs < freq_end))[0]
-                
-                if len(bin_indices) > 0:
-                    # Average power in this frequency bin
-                    binned_spectrograms[ch_idx, win_idx, bin_idx] = np.mean(
-                        spectrograms[ch_idx, win_idx, bin_indices])
-    
-    # Apply 15-second running average for temporal smoothing
-    smooth_window = 15  # in steps (since each step is 1 second)
-    smoothed_spectrograms = np.zeros_like(binned_spectrograms)
-    
-    # FIX: Skip smoothing if we don't have enough windows
-    if n_windows < smooth_window:
-        # Just copy the data without smoothing
-        smoothed_spectrograms = binned_spectrograms.copy()
-    else:
-        # Original smoothing code
-        for ch_idx in range(n_channels):
-            for freq_idx in range(n_bins):
-                # Use convolution for running average
-                kernel = np.ones(smooth_window) / smooth_window
-                smoothed_spectrograms[ch_idx, :, freq_idx] = np.convolve(
-                    binned_spectrograms[ch_idx, :, freq_idx], kernel, mode='same')
-    
-    # Convert to decibels
-    # Add small constant to avoid log(0)
-    db_spectrograms = 10 * np.log10(smoothed_spectrograms + 1e-10)
-    
-    # Create feature vectors
-    n_features = n_channels * n_bins
-    features = np.zeros((n_windows, n_features))
-    
-    for win_idx in range(n_windows):
-        # Flatten the spectrograms for this time point
-        features[win_idx, :] = db_spectrograms[:, win_idx, :].flatten()
+    # --- vectorized version of the CLAUDE rewrite of MNE implementation from train_focus.ipynb (see _features.py)
+    features = focus_features(raw_data, sfreq)
     
     # --- Prediction part
     # print(f"Raw data shape: {raw_data.shape}")
     # print(f"Features shape: {features.shape}")
     
-    # Assuming scaler and clf are defined elsewhere
-    scaled = scaler.transform(features)
-    # print(f"Scaled features shape: {scaled.shape}")
+    return predict_focus_features(features)
+
+
+def predict_focus_features(features: np.ndarray):
+    """
+    expects already extracted focus features of shape (1, n_features), f.e. from FocusFeatureEngine
+    """
     
-    probs = clf.predict_proba(scaled)[0][1]  # 1 represents focused [:, 1]
+    with focus_run_time.time():
+        scaled = scaler.get().transform(features)
+        # print(f"Scaled features shape: {scaled.shape}")
+        
+        probs = clf.get().predict_proba(scaled)[0][1]  # 1 represents focused [:, 1]
     # print(f"Probabilities shape: {probs.shape}")
     
     return probs
 
 
-class IncrementalSVC(SVC):
-    def __init__(self, C=1.0, kernel='rbf', degree=3, gamma='scale',
-                 coef0=0.0, shrinking=True, probability=False,
-                 tol=1e-3, cache_size=200, class_weight=None,
-                 verbose=False, max_iter=-1, decision_function_shape='ovr',
-                 break_ties=False, random_state=None):
-
-        super().__init__(
-            C=C, kernel=kernel, degree=degree, gamma=gamma,
-            coef0=coef0, shrinking=shrinking, probability=probability,
-            tol=tol, cache_size=cache_size, class_weight=class_weight,
-            verbose=verbose, max_iter=max_iter,
-            decision_function_shape=decision_function_shape,
-            break_ties=break_ties, random_state=random_state
-        )
-        self.X_train = None
-        self.y_train = None
-
-    def partial_fit(self, X, y, classes=None):
-        """Incrementally fit the model by storing all data and retraining."""
-        # First time training
-        if self.X_train is None:
-            self.X_train = X.copy()
-            self.y_train = y.copy()
-        else:
-            # Append new data
-            self.X_train = np.vstack((self.X_train, X))
-            self.y_train = np.append(self.y_train, y)
-
-        # Retrain on all data
-        super().fit(self.X_train, self.y_train)
-        return self
-
-def finetune_focus(raw_focused: np.ndarray, raw_unfocused: np.ndarray, sfreq=128):
+# --- warmup
+all_models = [cogload_model, scaler, clf]
+
+
+def warmup_models(models:list=None):
     """
-    expects two 40s array (which at 128Hz would mean 5120 each)
+    loads all model slots in a background thread, so the first prediction doesn't pay for it - returns the thread
     """
     
-    if (len(raw_focused) / sfreq != 40) or (len(raw_unfocused) / sfreq != 40):
-        raise Exception("wrong length")
-    
-    
-    # since even first item requires 14s previosly, this means that 40s yields 26 items
-    x = []
-    y = []
-    for i in range(14, 40):
-        x.append(raw_focused[i])
-        y.append(1)
-        x.append(raw_unfocused[i])
-        y.append(0)
-        
-        
-    x_train, x_test, y_train, y_test = train_test_split(
-        x, y, test_size=0.2, stratify=y
-    )
-    
-    return
-    
\ No newline at end of file
+    models = all_models if models is None else models
+    
+    def warmup():
+        for model in models:
+            try:
+                model.get()
+            except Exception as e:
+                print(f"--- loading {model.name} failed: {e} ---")
+        print("models warm: " + ", ".join(f"{model.name} {model.load_time:.2f}s" for model in models if model.loaded))
+    
+    thread = threading.Thread(target=warmup, name="model-warmup")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+# throughput of single vs batched cogload scoring on random data
+if __name__ == "__main__":
+    import time
+    
+    sfreq = 128
+    raw = np.random.randn(7, sfreq * 30).astype(np.float32) * 20
+    
+    start = time.perf_counter()
+    window_samples = 4 * sfreq
+    for window_start in range(0, raw.shape[1] - window_samples + 1, sfreq // 2):
+        predict_cogload(raw[:, window_start:window_start + window_samples], sfreq)
+    n_single = len(range(0, raw.shape[1] - window_samples + 1, sfreq // 2))
+    single_time = time.perf_counter() - start
+    print(f"single: {n_single} windows in {single_time:.2f}s - {n_single / single_time:.1f} windows/s")
+    
+    for batch_size in (8, 32, 64):
+        start = time.perf_counter()
+        probs, starts = predict_cogload_batch(raw, sfreq, hop_seconds=0.5, batch_size=batch_size)
+        batch_time = time.perf_counter() - start
+        print(f"batch_size {batch_size}: {len(probs)} windows in {batch_time:.2f}s - {len(probs) / batch_time:.1f} windows/s")
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+import dotenv
+import numpy as np
+import onnxruntime as ort
+
+
+dotenv.load_dotenv()
+
+# produced by optimize_model.py next to the fp32 model, f.e. inference.int8_static.onnx
+model_variants = ("fp32", "int8_dynamic", "int8_static", "fp16")
+report_path = "./model_report.json"     # accuracy of every variant against fp32, also written by optimize_model.py
+
+execution_modes = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def variant_path(path:str, variant:str="fp32"):
+    if variant not in model_variants:
+        raise Exception(f"unknown model variant {variant}, expected one of {model_variants}")
+
+    if variant == "fp32":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{variant}{ext}"
+
+
+def checked_variant(variant:str):
+    """
+    variant if model_report.json says it passed the accuracy gate, otherwise "fp32"
+    """
+
+    if variant == "fp32":
+        return variant
+
+    try:
+        with open(report_path) as f:
+            entry = json.load(f).get(variant)
+    except (OSError, ValueError):
+        entry = None
+
+    if entry is None:
+        print(f"--- cogload model variant {variant} is not in {report_path}, run optimize_model.py - falling back to fp32 ---")
+        return "fp32"
+    if not entry.get("passed", False):
+        print(f"--- cogload model variant {variant} failed the accuracy gate (agreement {entry['agreement']:.1%}, "
+              f"max diff {entry['max_prob_diff']:.4f}) - falling back to fp32 ---")
+        return "fp32"
+    return variant
+
+
+class OnnxModel:
+    """
+    InferenceSession with explicit threading / execution mode and IO binding
+    - input and output buffers are bound once per batch size and reused, run() only copies the input in
+    - optimized_model_path caches the graph after ORT's optimizations on disk, later starts load it without optimizing again
+    """
+
+    def __init__(self, path:str, providers:list=None, intra_op_threads:int=0, inter_op_threads:int=0,
+                 execution_mode:str="sequential", optimized_model_path:str=None):
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"need {path} file with model")
+
+        if providers is None:
+            # fallbacks to CPU if CUDA isn't available
+            providers = [p for p in ('CUDAExecutionProvider', 'CPUExecutionProvider') if p in ort.get_available_providers()]
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = intra_op_threads     # 0 lets ORT decide
+        session_options.inter_op_num_threads = inter_op_threads
+        session_options.execution_mode = execution_modes[execution_mode]
+
+        load_path = path
+        if optimized_model_path and os.path.exists(optimized_model_path) and os.path.getmtime(optimized_model_path) >= os.path.getmtime(path):
+            # already optimized for this machine, skip the optimization passes
+            load_path = optimized_model_path
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if optimized_model_path:
+                session_options.optimized_model_filepath = optimized_model_path
+
+        start = time.perf_counter()
+        self.session = ort.InferenceSession(load_path, sess_options=session_options, providers=providers)
+        self.load_time = time.perf_counter() - start
+
+        self.path = load_path
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        self.input_shape = tuple(self.session.get_inputs()[0].shape[1:])      # without the batch dimension
+        self.output_shape = tuple(self.session.get_outputs()[0].shape[1:])
+
+        self._bindings = {}     # batch size -> (io binding, input buffer, output buffer)
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def from_env(cls, path:str, variant:str=None):
+        """
+        settings from .env: COGLOAD_MODEL_VARIANT (see model_variants), COGLOAD_PROVIDERS (comma separated),
+        COGLOAD_INTRA_OP_THREADS, COGLOAD_INTER_OP_THREADS, COGLOAD_EXECUTION_MODE (sequential / parallel)
+        and COGLOAD_CACHE_OPTIMIZED (caches the optimized graph as f.e. inference.optimized.onnx)
+        - an explicit variant overrides COGLOAD_MODEL_VARIANT, "fp32" loads path as it is
+        - other variants are only loaded if they passed the accuracy gate in model_report.json, else fp32 is
+        """
+
+        path = variant_path(path, checked_variant(variant or os.getenv("COGLOAD_MODEL_VARIANT", "fp32")))
+        root, ext = os.path.splitext(path)
+        cache_optimized = os.getenv("COGLOAD_CACHE_OPTIMIZED", "false").lower() in ("1", "true", "yes")
+
+        providers = os.getenv("COGLOAD_PROVIDERS")
+        return cls(
+            path,
+            providers=[p.strip() for p in providers.split(",")] if providers else None,
+            intra_op_threads=int(os.getenv("COGLOAD_INTRA_OP_THREADS", 0)),
+            inter_op_threads=int(os.getenv("COGLOAD_INTER_OP_THREADS", 0)),
+            execution_mode=os.getenv("COGLOAD_EXECUTION_MODE", "sequential"),
+            optimized_model_path=f"{root}.optimized{ext}" if cache_optimized else None,
+        )
+
+
+    def _binding(self, batch_size:int):
+        if batch_size not in self._bindings:
+            input_buffer = np.zeros((batch_size,) + self.input_shape, dtype=np.float32)
+            output_buffer = np.zeros((batch_size,) + self.output_shape, dtype=np.float32)
+
+            binding = self.session.io_binding()
+            binding.bind_input(self.input_name, "cpu", 0, np.float32, input_buffer.shape, input_buffer.ctypes.data)
+            binding.bind_output(self.output_name, "cpu", 0, np.float32, output_buffer.shape, output_buffer.ctypes.data)
+            self._bindings[batch_size] = (binding, input_buffer, output_buffer)
+
+        return self._bindings[batch_size]
+
+    def run(self, input_data:np.ndarray):
+        """
+        input_data of shape (batch_size, *input_shape) - returns a copy of the outputs of shape (batch_size, *output_shape)
+        """
+
+        with self._lock:
+            binding, input_buffer, output_buffer = self._binding(len(input_data))
+            np.copyto(input_buffer, input_data, casting="same_kind")
+            self.session.run_with_iobinding(binding)
+            return output_buffer.copy()
+
+
+    def benchmark(self, n_runs:int=50, batch_size:int=1):
+        """
+        runs random inputs, returns latencies in ms {"p50": ..., "p99": ...} (after one warm-up run)
+        """
+
+        input_data = np.random.randn(batch_size, *self.input_shape).astype(np.float32)
+        self.run(input_data)
+
+        latencies = []
+        for _ in range(n_runs):
+            start = time.perf_counter()
+            self.run(input_data)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        return {"p50": float(np.percentile(latencies, 50)), "p99": float(np.percentile(latencies, 99))}
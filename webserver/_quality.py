@@ -0,0 +1,147 @@
+import collections
+import threading
+import numpy as np
+
+
+class StreamMonitor:
+    """
+    checks the timestamps of every incoming chunk against the nominal sfreq, before they go into the ring buffer
+    - gaps: an interval longer than gap_factor sample periods, round(interval * sfreq) - 1 samples count as missing
+    - bursts: intervals shorter than burst_factor periods (samples bunched up by the transport), only counted
+    - samples that don't come after the previous one in time are dropped, the ring buffer's lookups need sorted timestamps
+    - gaps up to interpolate_seconds are filled with linearly interpolated samples, longer ones stay empty - both are
+      remembered, so coverage() only counts real samples (the ring buffer's own coverage() counts interpolated ones too)
+    - jitter is the exponential moving average of |interval - period| over all intervals
+    """
+
+    def __init__(self, sfreq:float, gap_factor:float=2.0, burst_factor:float=0.5, interpolate_seconds:float=0.1,
+                 max_gaps:int=1000, jitter_smoothing:float=0.01):
+
+        self.sfreq = float(sfreq)
+        self.period = 1 / self.sfreq
+        self.gap_factor = gap_factor
+        self.burst_factor = burst_factor
+        self.max_interpolated = int(interpolate_seconds * self.sfreq)
+        self.jitter_smoothing = jitter_smoothing
+
+        self.samples = 0                # received, without the dropped ones
+        self.gaps = 0
+        self.missing_samples = 0        # in all gaps, interpolated or not
+        self.interpolated_samples = 0
+        self.burst_samples = 0
+        self.dropped_samples = 0
+        self.jitter = 0.0               # seconds
+
+        self._gaps = collections.deque(maxlen=max_gaps)     # (start, end timestamp, missing samples), oldest first
+        self._last_sample = None
+        self._last_timestamp = None
+        self._lock = threading.Lock()
+
+
+    def process(self, samples, timestamps):
+        """
+        checks one chunk (samples of shape (n_samples, n_channels), unix timestamps) - returns the (samples, timestamps)
+        to write into the ring buffer: without dropped samples and with short gaps filled
+        """
+
+        samples = np.asarray(samples, dtype=np.float32).reshape(len(timestamps), -1)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        # drop everything that doesn't continue forward in time
+        last = self._last_timestamp if self._last_timestamp is not None else -np.inf
+        keep = timestamps > np.maximum.accumulate(np.concatenate([[last], timestamps]))[:-1]
+        if not keep.all():
+            self.dropped_samples += int((~keep).sum())
+            samples, timestamps = samples[keep], timestamps[keep]
+        if len(timestamps) == 0:
+            return samples, timestamps
+
+        with self._lock:
+            if self._last_timestamp is None:
+                intervals = np.diff(timestamps)
+                extended_samples, extended_timestamps = samples, timestamps
+            else:
+                intervals = np.diff(timestamps, prepend=self._last_timestamp)
+                extended_samples = np.concatenate([self._last_sample[None], samples])
+                extended_timestamps = np.concatenate([[self._last_timestamp], timestamps])
+
+            self.samples += len(timestamps)
+            self._last_sample = samples[-1].copy()
+            self._last_timestamp = timestamps[-1]
+            if len(intervals) == 0:
+                return samples, timestamps
+
+            self.burst_samples += int((intervals < self.burst_factor * self.period).sum())
+            # the moving average over all intervals of the chunk at once
+            decay = (1 - self.jitter_smoothing) ** np.arange(len(intervals) - 1, -1, -1)
+            self.jitter = (1 - self.jitter_smoothing) ** len(intervals) * self.jitter \
+                          + self.jitter_smoothing * float((decay * np.abs(intervals - self.period)).sum())
+
+            # interval i ends at extended sample i + 1
+            gap_idxs = np.flatnonzero(intervals > self.gap_factor * self.period)
+            if len(gap_idxs) == 0:
+                return samples, timestamps
+
+            missing = np.maximum(np.round(intervals[gap_idxs] * self.sfreq).astype(int) - 1, 1)
+            self.gaps += len(gap_idxs)
+            self.missing_samples += int(missing.sum())
+            for gap_idx, n_missing in zip(gap_idxs, missing):
+                self._gaps.append((extended_timestamps[gap_idx], extended_timestamps[gap_idx + 1], int(n_missing)))
+
+            fill = [(gap_idx, n_missing) for gap_idx, n_missing in zip(gap_idxs, missing) if n_missing <= self.max_interpolated]
+            if not fill:
+                return samples, timestamps
+            return self._interpolate(samples, timestamps, extended_samples, extended_timestamps, fill)
+
+    def _interpolate(self, samples, timestamps, extended_samples, extended_timestamps, fill):
+        offset = len(extended_timestamps) - len(timestamps)     # 1 if the previous chunk's last sample leads
+        parts_samples, parts_timestamps = [], []
+        start = 0
+        for gap_idx, n_missing in fill:
+            before, after = extended_timestamps[gap_idx], extended_timestamps[gap_idx + 1]
+            weights = np.arange(1, n_missing + 1) / (n_missing + 1)
+            end = gap_idx + 1 - offset      # first new sample after the gap
+
+            parts_samples += [samples[start:end], extended_samples[gap_idx] + weights[:, None] * (extended_samples[gap_idx + 1] - extended_samples[gap_idx])]
+            parts_timestamps += [timestamps[start:end], before + weights * (after - before)]
+            start = end
+            self.interpolated_samples += int(n_missing)
+
+        parts_samples.append(samples[start:])
+        parts_timestamps.append(timestamps[start:])
+        return np.concatenate(parts_samples).astype(np.float32), np.concatenate(parts_timestamps)
+
+
+    def missing_between(self, start_timestamp:float, end_timestamp:float):
+        """
+        samples missing (interpolated or not) between the two timestamps, gaps only partly inside count pro rata
+        """
+
+        with self._lock:
+            if not self._gaps:
+                return 0.0
+            gaps = np.array(self._gaps)
+
+        overlap = np.clip(np.minimum(gaps[:, 1], end_timestamp) - np.maximum(gaps[:, 0], start_timestamp), 0, None)
+        return float((gaps[:, 2] * overlap / (gaps[:, 1] - gaps[:, 0])).sum())
+
+    def coverage(self, buffer, start_timestamp:float, end_timestamp:float):
+        """
+        fraction of real samples between the two timestamps - lower of what the buffer holds and what wasn't missing
+        """
+
+        expected = (end_timestamp - start_timestamp) * self.sfreq
+        if expected <= 0:
+            return 1.0
+        return min(buffer.coverage(start_timestamp, end_timestamp), max(0.0, 1 - self.missing_between(start_timestamp, end_timestamp) / expected))
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "gaps": self.gaps,
+            "missing_samples": self.missing_samples,
+            "interpolated_samples": self.interpolated_samples,
+            "burst_samples": self.burst_samples,
+            "dropped_samples": self.dropped_samples,
+            "jitter_ms": self.jitter * 1000,
+        }
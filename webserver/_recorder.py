@@ -0,0 +1,203 @@
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+
+class SessionRecorder:
+    """
+    records every chunk of the stream to disk, so whole sessions can be re-scored or trained on later (the ring buffer
+    only keeps the last minutes)
+    - root/<session>/meta.json holds channels and sfreq, every part is a pair of append-only files:
+      <part>.samples.bin with float32 rows of shape (n_channels,), <part>.timestamps.bin with their float64 unix times
+    - record() only copies the chunk into a queue, a writer thread does the disk writes - the ingestion thread never
+      waits on the disk, if the queue is full (disk stalled for max_queue chunks) chunks are dropped and counted
+    - a new part starts after rotate_seconds or rotate_mb, parts.jsonl gets one line per finished part
+    """
+
+    def __init__(self, ch_names:list, sfreq:float, root:str="./collected_data/sessions", session:str=None,
+                 rotate_seconds:float=600, rotate_mb:float=256, max_queue:int=1000):
+
+        self.n_channels = len(ch_names)
+        self.sfreq = float(sfreq)
+        self.session = session or time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(root, self.session)
+        self.rotate_seconds = rotate_seconds
+        self.rotate_bytes = int(rotate_mb * 1024**2)
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"ch_names": list(ch_names), "sfreq": self.sfreq, "dtype": "float32", "started": time.time()}, f)
+
+        self.dropped_chunks = 0
+        self.written_samples = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._part = None       # {"name", "samples", "timestamps", "opened", "bytes", "count", "start_time", "end_time"}
+        self._part_idx = 0
+        self._thread = None
+
+
+    # --- ingestion side
+    def record(self, samples, timestamps):
+        """
+        samples of shape (n_samples, n_channels), timestamps in unix time - copied, the caller may reuse its arrays
+        """
+
+        if len(timestamps) == 0:
+            return
+
+        chunk = (np.array(samples, dtype=np.float32).reshape(-1, self.n_channels), np.array(timestamps, dtype=np.float64))
+        try:
+            self._queue.put_nowait(chunk)
+        except queue.Full:
+            self.dropped_chunks += 1
+
+
+    # --- writer thread
+    def start(self):
+        self._thread = threading.Thread(target=self._write_loop, name="session-recorder")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout:float=5.0):
+        """
+        writes what is still queued, then closes the current part
+        """
+
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            chunks = [self._queue.get()]
+            # drain whatever else is queued, so a slow write is followed by one bigger write instead of falling behind
+            while True:
+                try:
+                    chunks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = chunks[-1] is None
+            chunks = [chunk for chunk in chunks if chunk is not None]
+            if chunks:
+                self._write(np.concatenate([samples for samples, _ in chunks]), np.concatenate([ts for _, ts in chunks]))
+            if stopping:
+                self._close_part()
+                return
+
+    def _write(self, samples, timestamps):
+        part = self._part
+        if part is not None and (time.time() - part["opened"] > self.rotate_seconds or part["bytes"] >= self.rotate_bytes):
+            self._close_part()
+            part = None
+        if part is None:
+            part = self._open_part()
+
+        part["samples"].write(samples.tobytes())
+        part["timestamps"].write(timestamps.tobytes())
+        part["samples"].flush()
+        part["timestamps"].flush()
+
+        part["bytes"] += samples.nbytes + timestamps.nbytes
+        part["count"] += len(samples)
+        part["start_time"] = part["start_time"] if part["start_time"] is not None else float(timestamps[0])
+        part["end_time"] = float(timestamps[-1])
+        self.written_samples += len(samples)
+
+    def _open_part(self):
+        name = f"{self._part_idx:04d}"
+        self._part_idx += 1
+        self._part = {
+            "name": name,
+            "samples": open(os.path.join(self.path, f"{name}.samples.bin"), "ab"),
+            "timestamps": open(os.path.join(self.path, f"{name}.timestamps.bin"), "ab"),
+            "opened": time.time(), "bytes": 0, "count": 0, "start_time": None, "end_time": None,
+        }
+        return self._part
+
+    def _close_part(self):
+        part = self._part
+        if part is None:
+            return
+
+        for f in (part["samples"], part["timestamps"]):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        with open(os.path.join(self.path, "parts.jsonl"), "a") as f:
+            f.write(json.dumps({key: part[key] for key in ("name", "count", "start_time", "end_time")}) + "\n")
+        self._part = None
+
+
+class SessionReader:
+    """
+    reads a session written by SessionRecorder, parts are memory-mapped
+    - the part that is still being written is included, up to the last complete row
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.ch_names = self.meta["ch_names"]
+        self.sfreq = self.meta["sfreq"]
+
+
+    def parts(self):
+        """
+        part names, oldest first
+        """
+        return sorted(fname[:-len(".samples.bin")] for fname in os.listdir(self.path) if fname.endswith(".samples.bin"))
+
+    def part(self, name:str):
+        """
+        (samples of shape (n_samples, n_channels), timestamps) of one part as read-only memory maps
+        """
+
+        samples_path = os.path.join(self.path, f"{name}.samples.bin")
+        timestamps_path = os.path.join(self.path, f"{name}.timestamps.bin")
+        row_bytes = 4 * len(self.ch_names)
+        count = min(os.path.getsize(samples_path) // row_bytes, os.path.getsize(timestamps_path) // 8)
+        if count == 0:
+            return np.zeros((0, len(self.ch_names)), dtype=np.float32), np.zeros(0)
+
+        samples = np.memmap(samples_path, dtype=np.float32, mode="r", shape=(count, len(self.ch_names)))
+        timestamps = np.memmap(timestamps_path, dtype=np.float64, mode="r", shape=(count,))
+        return samples, timestamps
+
+    def read(self, start_timestamp:float=None, end_timestamp:float=None):
+        """
+        (samples, timestamps) with start_timestamp <= timestamp < end_timestamp (None = open ended)
+        - views into the memory map if the range lies within one part, otherwise the parts are concatenated
+        """
+
+        samples, timestamps = [], []
+        for name in self.parts():
+            part_samples, part_timestamps = self.part(name)
+            if len(part_timestamps) == 0:
+                continue
+            if start_timestamp is not None and part_timestamps[-1] < start_timestamp:
+                continue
+            if end_timestamp is not None and part_timestamps[0] >= end_timestamp:
+                break
+
+            start = 0 if start_timestamp is None else np.searchsorted(part_timestamps, start_timestamp, side="left")
+            end = len(part_timestamps) if end_timestamp is None else np.searchsorted(part_timestamps, end_timestamp, side="left")
+            samples.append(part_samples[start:end])
+            timestamps.append(part_timestamps[start:end])
+
+        if not samples:
+            return np.zeros((0, len(self.ch_names)), dtype=np.float32), np.zeros(0)
+        if len(samples) == 1:
+            return samples[0], timestamps[0]
+        return np.concatenate(samples), np.concatenate(timestamps)
+
+
+def list_sessions(root:str="./collected_data/sessions"):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "meta.json")))
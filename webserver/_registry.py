@@ -0,0 +1,209 @@
+import os
+import shutil
+import threading
+import time
+import traceback
+import joblib
+
+
+class ModelSlot:
+    """
+    one servable model (f.e. the focus svm) - the current version plus the previous one, kept loaded for rollback
+    - get() loads the initial version on first use (or earlier through warmup)
+    - swap() and rollback() only replace a reference, predictions that already hold the old model just finish with it
+    """
+
+    def __init__(self, name:str, loader, version:str, path:str):
+        self.name = name
+        self._loader = loader       # path -> model
+        self._initial = (version, path)
+        self._current = None        # (version, model)
+        self._previous = None
+        self._lock = threading.Lock()
+        self.load_time = None
+
+
+    @property
+    def loaded(self):
+        return self._current is not None
+
+    @property
+    def version(self):
+        current = self._current
+        return current[0] if current else None
+
+    @property
+    def previous_version(self):
+        previous = self._previous
+        return previous[0] if previous else None
+
+    def get(self):
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    version, path = self._initial
+                    self._current = (version, self._load(path))
+                current = self._current
+        return current[1]
+
+
+    def _load(self, path:str):
+        start = time.perf_counter()
+        model = self._loader(path)
+        self.load_time = time.perf_counter() - start
+        return model
+
+    def set_initial(self, version:str, path:str):
+        """
+        changes what get() loads first, only has an effect before the slot was loaded
+        """
+        with self._lock:
+            self._initial = (version, path)
+
+    def load(self, version:str, path:str):
+        """
+        loads a new version next to the serving one and swaps it in once it is ready
+        """
+        self.swap(version, self._load(path))
+
+    def swap(self, version:str, model):
+        with self._lock:
+            self._previous = self._current
+            self._current = (version, model)
+
+    def rollback(self):
+        """
+        swaps back to the previous version (and the current one becomes the previous) - False if there is none
+        """
+        with self._lock:
+            if self._previous is None:
+                return False
+            self._current, self._previous = self._previous, self._current
+            return True
+
+
+class ModelRegistry:
+    """
+    versioned models in models_dir/<name>/<version><extension>, watched by a background thread
+    - versions sort by name, publish() names them by time so the newest one wins
+    - a new version is loaded in the watcher thread and then swapped into its slot, nothing has to restart
+    - files are only published with an atomic rename, so the watcher never sees half written models
+    - without any version in models_dir, a slot serves its base file (f.e. ./svm_0.pkl) as version "base"
+    """
+
+    def __init__(self, models_dir:str="./models", poll_interval:float=2.0):
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+        self._slots = {}    # name -> (slot, extension)
+        self._newest = {}   # name -> newest version that was seen (loaded or failed), to not retry it every poll
+        self._stop_flag = threading.Event()
+        self._thread = None
+
+
+    def register(self, name:str, loader, base_path:str, extension:str):
+        os.makedirs(os.path.join(self.models_dir, name), exist_ok=True)
+
+        slot = ModelSlot(name, loader, "base", base_path)
+        versions = self.versions(name, extension)
+        if versions:
+            slot.set_initial(versions[-1], self.path(name, versions[-1], extension))
+
+        self._slots[name] = (slot, extension)
+        self._newest[name] = versions[-1] if versions else None
+        return slot
+
+    def slot(self, name:str):
+        return self._slots[name][0]
+
+
+    def path(self, name:str, version:str, extension:str):
+        return os.path.join(self.models_dir, name, f"{version}{extension}")
+
+    def versions(self, name:str, extension:str=None):
+        """
+        sorted version names in the folder of name, oldest first
+        - <version>.optimized<extension> is the graph cache OnnxModel writes next to a model, not a version of its own
+        """
+
+        extension = extension or self._slots[name][1]
+        folder = os.path.join(self.models_dir, name)
+        if not os.path.isdir(folder):
+            return []
+
+        return sorted(
+            fname[:-len(extension)] for fname in os.listdir(folder)
+            if fname.endswith(extension) and not fname.startswith(".") and not fname.endswith(f".optimized{extension}")
+        )
+
+
+    def publish(self, name:str, source, extension:str=None, version:str=None):
+        """
+        adds a new version - source is either a file path (f.e. an .onnx) or an object to joblib.dump
+        returns the version, the watcher picks it up with its next poll
+        """
+
+        extension = extension or self._slots[name][1]
+        version = version or time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        folder = os.path.join(self.models_dir, name)
+        os.makedirs(folder, exist_ok=True)
+
+        # hidden temp file in the same folder (same filesystem), renamed in one step
+        tmp_path = os.path.join(folder, f".{version}{extension}.tmp")
+        if isinstance(source, str):
+            shutil.copyfile(source, tmp_path)
+        else:
+            joblib.dump(source, tmp_path)
+        os.replace(tmp_path, self.path(name, version, extension))
+        return version
+
+
+    def check(self):
+        """
+        loads and swaps in every slot's newest version if it is newer than what was seen so far
+        """
+
+        for name, (slot, extension) in self._slots.items():
+            versions = self.versions(name, extension)
+            if not versions or (self._newest[name] is not None and versions[-1] <= self._newest[name]):
+                continue
+
+            version = versions[-1]
+            self._newest[name] = version
+            path = self.path(name, version, extension)
+
+            if not slot.loaded:
+                slot.set_initial(version, path)
+                continue
+
+            try:
+                slot.load(version, path)
+                print(f"--- {name}: swapped to version {version} ({slot.load_time:.2f}s), previous {slot.previous_version} ---")
+            except Exception:
+                print(f"--- {name}: loading version {version} failed, keeping {slot.version} ---")
+                traceback.print_exc()
+
+    def rollback(self, name:str):
+        return self.slot(name).rollback()
+
+    def status(self):
+        return {
+            name: {"version": slot.version, "previous": slot.previous_version, "available": self.versions(name, extension)}
+            for name, (slot, extension) in self._slots.items()
+        }
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, name="model-registry")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_flag.set()
+
+    def _watch(self):
+        while not self._stop_flag.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception:
+                traceback.print_exc()
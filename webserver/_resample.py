@@ -0,0 +1,118 @@
+from fractions import Fraction
+from functools import lru_cache
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+from _buffer import RingBuffer
+
+
+@lru_cache(maxsize=None)
+def polyphase_filter(source_sfreq:float, target_sfreq:float):
+    """
+    anti-aliasing FIR for resampling by up/down, split into its polyphase components - cached per rate pair
+    - same design as scipy.signal.resample_poly (kaiser window, cutoff at the lower nyquist)
+    - returns (up, down, phases, delay) - phases of shape (up, n_taps_per_phase) are already reversed for a dot product,
+      delay is the group delay of the filter in input samples
+    """
+
+    ratio = Fraction(target_sfreq / source_sfreq).limit_denominator(1000)
+    up, down = ratio.numerator, ratio.denominator
+
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * up
+
+    # pad to a multiple of up, phase p holds taps[p], taps[p + up], taps[p + 2*up], ...
+    n_per_phase = -(-len(taps) // up)
+    padded = np.zeros(n_per_phase * up)
+    padded[:len(taps)] = taps
+    phases = padded.reshape(n_per_phase, up).T[:, ::-1].copy()
+
+    delay = half_len / up
+    return up, down, phases, delay
+
+
+class StreamingDownsampler:
+    """
+    resamples a RingBuffer into a second RingBuffer at target_sfreq, only touching samples that arrived since the last update()
+    - polyphase FIR with the last taps of input kept as state between calls, so the cost per call only depends on the new samples
+    - output timestamps are shifted by the filter's group delay, so they still line up with the input timestamps
+    """
+
+    def __init__(self, source:RingBuffer, target_sfreq:float, max_seconds:float=180):
+        if source.sfreq < target_sfreq:
+            raise Exception(f"{source.sfreq} is smaller than target sfreq of {target_sfreq}")
+
+        self.source = source
+        self.target_sfreq = target_sfreq
+        self.output = RingBuffer(source.n_channels, target_sfreq, max_seconds=max_seconds)
+
+        self.up, self.down, self._phases, delay = polyphase_filter(source.sfreq, target_sfreq)
+        self.delay_seconds = delay / source.sfreq   # an output sample at t needs the inputs up to t + delay_seconds
+        self._n_taps = self._phases.shape[1]
+
+        self._lock = threading.Lock()
+        self._reset(0)
+
+
+    def _reset(self, index):
+        """
+        (re)starts the filter at absolute input index, with zeros as history
+        """
+        self._history = np.zeros((self._n_taps - 1, self.source.n_channels), dtype=np.float32)
+        self._history_timestamps = np.zeros(self._n_taps - 1, dtype=np.float64)
+        self._start = index     # absolute input index where the current run started
+        self._n_in = index      # next input index to consume
+        self._n_out = 0         # outputs produced in the current run
+
+
+    def update(self):
+        """
+        pulls everything new from the source buffer, filters it and appends the result to self.output
+        returns the number of output samples added
+        """
+
+        with self._lock:
+            samples, timestamps, start_index = self.source.since(self._n_in)
+
+            # fell behind by more than the source capacity, the filter state does not belong to these samples anymore
+            if start_index != self._n_in:
+                self._reset(start_index)
+
+            return self._process(samples, timestamps)
+
+
+    def _process(self, samples, timestamps):
+        n_new = len(samples)
+        if n_new == 0:
+            return 0
+
+        consumed = self._n_in - self._start + n_new     # inputs seen in this run including the new ones
+
+        # outputs n whose newest needed input (n * down) // up has arrived
+        n_end = -(-consumed * self.up // self.down)
+        n = np.arange(self._n_out, n_end)
+
+        extended = np.concatenate([self._history, samples])
+        extended_timestamps = np.concatenate([self._history_timestamps, timestamps])
+
+        if len(n):
+            newest = (n * self.down) // self.up - (self._n_in - self._start)    # relative to the new samples
+            phase = (n * self.down) % self.up
+
+            # row w of the windows holds extended[w:w + n_taps], which ends at new sample w
+            windows = sliding_window_view(extended, self._n_taps, axis=0)[newest]
+            out = np.einsum("nck,nk->nc", windows, self._phases[phase]).astype(np.float32)
+
+            # unix time of the fractional input position, minus the group delay
+            fractional = (n * self.down) / self.up - (n * self.down) // self.up
+            out_timestamps = extended_timestamps[newest + self._n_taps - 1] + fractional / self.source.sfreq - self.delay_seconds
+
+            self.output.extend(out, out_timestamps)
+
+        self._history = extended[-(self._n_taps - 1):].copy()
+        self._history_timestamps = extended_timestamps[-(self._n_taps - 1):].copy()
+        self._n_in += n_new
+        self._n_out = n_end
+        return len(n)
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from _cwt import cwt_spectrum
+from _features import focus_features, focus_step_size
+
+
+class FeatureStore:
+    """
+    precomputed features of the calibration recordings, so retraining never recomputes STFTs or CWTs
+    - root/<kind>/features.bin holds float32 rows of one fixed shape per kind (f.e. "focus": (252,), "cogload": (7, 64, 512)),
+      timestamps.bin the unix time of the first sample of every row - both are memory-mapped for reading
+    - root/<kind>/manifest.jsonl has one line per added recording: subject, session, label, source file, offset and count
+      of its rows, start and end time
+    - rows are appended before their manifest line, readers only look at rows a manifest line covers
+    """
+
+    def __init__(self, root:str="./collected_data/features"):
+        self.root = root
+        self._lock = threading.Lock()
+
+
+    def _path(self, kind:str, fname:str):
+        return os.path.join(self.root, kind, fname)
+
+    def _meta(self, kind:str):
+        path = self._path(kind, "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def add(self, kind:str, features:np.ndarray, timestamps:np.ndarray, subject:str, session:str, label:str, source:str=None):
+        """
+        appends the rows of one recording (features of shape (n_rows, *row_shape)) - returns its manifest entry
+        """
+
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        timestamps = np.ascontiguousarray(timestamps, dtype=np.float64)
+        if len(features) != len(timestamps):
+            raise Exception(f"{len(features)} feature rows but {len(timestamps)} timestamps")
+
+        with self._lock:
+            os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+
+            meta = self._meta(kind)
+            if meta is None:
+                meta = {"shape": list(features.shape[1:]), "dtype": "float32"}
+                with open(self._path(kind, "meta.json"), "w") as f:
+                    json.dump(meta, f)
+            elif list(features.shape[1:]) != meta["shape"]:
+                raise Exception(f"rows of shape {features.shape[1:]} don't fit {kind} rows of shape {tuple(meta['shape'])}")
+
+            entries = self.entries(kind)
+            offset = entries[-1]["offset"] + entries[-1]["count"] if entries else 0
+
+            # truncate rows a crashed add() might have left behind without a manifest line
+            row_bytes = int(np.prod(meta["shape"], dtype=np.int64)) * 4
+            for fname, data, size in (("features.bin", features, row_bytes), ("timestamps.bin", timestamps, 8)):
+                with open(self._path(kind, fname), "ab") as f:
+                    f.truncate(offset * size)
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            entry = {
+                "subject": subject, "session": str(session), "label": label, "source": source,
+                "offset": offset, "count": len(features),
+                "start_time": float(timestamps[0]) if len(timestamps) else None,
+                "end_time": float(timestamps[-1]) if len(timestamps) else None,
+            }
+            with open(self._path(kind, "manifest.jsonl"), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            return entry
+
+
+    def entries(self, kind:str, **filters):
+        """
+        manifest entries of kind, optionally only those matching all filters (f.e. subject="anna", label="focused")
+        """
+
+        path = self._path(kind, "manifest.jsonl")
+        if not os.path.exists(path):
+            return []
+
+        with open(path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return [entry for entry in entries if all(entry.get(key) == value for key, value in filters.items())]
+
+    def features(self, kind:str):
+        """
+        read-only memory map of all rows of kind - shape (n_rows, *row_shape)
+        """
+
+        entries = self.entries(kind)
+        meta = self._meta(kind)
+        if not entries or meta is None:
+            return np.zeros((0,) + tuple(meta["shape"] if meta else ()), dtype=np.float32)
+
+        n_rows = entries[-1]["offset"] + entries[-1]["count"]
+        return np.memmap(self._path(kind, "features.bin"), dtype=np.float32, mode="r", shape=(n_rows, *meta["shape"]))
+
+    def timestamps(self, kind:str):
+        entries = self.entries(kind)
+        if not entries:
+            return np.zeros(0)
+
+        n_rows = entries[-1]["offset"] + entries[-1]["count"]
+        return np.memmap(self._path(kind, "timestamps.bin"), dtype=np.float64, mode="r", shape=(n_rows,))
+
+    def source_features(self, kind:str, source:str):
+        """
+        rows of the recording that was added from source (a view into the memory map) - None if it isn't stored
+        """
+
+        entries = self.entries(kind, source=source)
+        if not entries:
+            return None
+        return self.features(kind)[entries[-1]["offset"]:entries[-1]["offset"] + entries[-1]["count"]]
+
+    def dataset(self, kind:str, **filters):
+        """
+        (rows, entry index per row, matching entries) for everything matching filters
+        - rows stay a memory-mapped view if the matching entries are contiguous, otherwise they are gathered into memory
+        """
+
+        all_entries = self.entries(kind)
+        entries = [entry for entry in all_entries if all(entry.get(key) == value for key, value in filters.items())]
+        features = self.features(kind)
+        if not entries:
+            return features[:0], np.zeros(0, dtype=int), []
+
+        rows = np.concatenate([np.arange(entry["offset"], entry["offset"] + entry["count"]) for entry in entries])
+        entry_index = np.repeat(np.arange(len(entries)), [entry["count"] for entry in entries])
+
+        if np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            return features[rows[0]:rows[0] + len(rows)], entry_index, entries
+        return features[rows], entry_index, entries
+
+
+# --- rows per recording, the same transforms the models see
+def focus_rows(raw:np.ndarray, timestamps:np.ndarray, sfreq=128):
+    """
+    (channels, samples) recording -> (focus feature vector per 1s step, unix time of each window's first sample)
+    """
+
+    features = focus_features(raw, sfreq)
+    starts = np.arange(len(features)) * int(focus_step_size * sfreq)
+    return features, timestamps[starts]
+
+
+def cogload_rows(raw:np.ndarray, timestamps:np.ndarray, sfreq=128, window_seconds=4, hop_seconds=2):
+    """
+    (channels, samples) recording -> (CWT tensor (channels, 64, window samples) per window, unix time of each window's first sample)
+    """
+
+    window_samples = int(window_seconds * sfreq)
+    hop_samples = int(hop_seconds * sfreq)
+    if raw.shape[1] < window_samples:
+        return np.zeros((0, raw.shape[0], 64, window_samples), dtype=np.float32), np.zeros(0)
+
+    windows = sliding_window_view(raw, window_samples, axis=1)[:, ::hop_samples]
+    rows = np.stack([cwt_spectrum(windows[:, i]) for i in range(windows.shape[1])])
+    return rows, timestamps[np.arange(len(rows)) * hop_samples]
@@ -0,0 +1,253 @@
+# --- end-to-end benchmarks of the webserver pipeline on a synthetic signal, no headset or LSL stream needed
+# python benchmark.py [older results.json]
+# writes benchmark_results.json (tagged with the git commit), pass an older results file to print what changed
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from werkzeug.serving import make_server
+import main
+from _models import predict_focus, predict_cogload
+
+
+results_path = "./benchmark_results.json"
+
+# synthetic source like lsl_stream.py, but at twice the model rate so the downsampler is part of every measurement
+ch_names = ['F7', 'F3', 'P7', 'O1', 'O2', 'P8', 'F4', 'A1']
+sfreq = 256
+chunk_seconds = 0.05    # what the LSL thread hands over per pull (its pull_timeout)
+
+n_runs = 100
+buffer_seconds = (1, 10, 60, 180)
+client_counts = (1, 4, 16)
+requests_per_client = 200
+
+
+def synthetic_signal(n_samples:int, start_time:float=0.0):
+    """
+    (samples of shape (n_samples, n_channels), unix timestamps) - noise plus a 10Hz alpha rhythm, roughly EEG-sized
+    """
+
+    t = np.arange(n_samples) / sfreq
+    samples = 20 * np.random.randn(n_samples, len(ch_names)) + 10 * np.sin(2 * np.pi * 10 * t)[:, None]
+    return samples.astype(np.float32), start_time + t
+
+
+def chunks(samples:np.ndarray, timestamps:np.ndarray):
+    chunk_samples = max(int(sfreq * chunk_seconds), 1)
+    for start in range(0, len(samples), chunk_samples):
+        yield samples[start:start + chunk_samples], timestamps[start:start + chunk_samples]
+
+
+def percentiles(latencies:list):
+    return {
+        "n": len(latencies),
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+        "max": float(np.max(latencies)),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+# --- benchmarks
+def bench_ingestion(seconds:float=180):
+    """
+    samples/s through handle_eeg_chunk (ring buffer writes), and the time per chunk
+    """
+
+    main.setup_pipeline(ch_names, sfreq)
+    samples, timestamps = synthetic_signal(int(seconds * sfreq), time.time())
+
+    latencies = []
+    start = time.perf_counter()
+    for chunk, chunk_timestamps in chunks(samples, timestamps):
+        latencies.append(timed(main.handle_eeg_chunk, chunk, chunk_timestamps))
+    elapsed = time.perf_counter() - start
+
+    return {"samples_per_s": len(samples) / elapsed, "chunk_ms": percentiles(latencies)}
+
+
+def bench_downsampling():
+    """
+    time for the downsampler to catch up with buffers of different lengths, and per chunk once it is caught up
+    """
+
+    catch_up = {}
+    for seconds in buffer_seconds:
+        main.setup_pipeline(ch_names, sfreq)
+        main.glob_buffer.extend(*synthetic_signal(int(seconds * sfreq)))
+        catch_up[str(seconds)] = timed(main.glob_downsampler.update)
+
+    latencies = []
+    samples, timestamps = synthetic_signal(n_runs * int(sfreq * chunk_seconds), 180.0)
+    for chunk, chunk_timestamps in chunks(samples, timestamps):
+        main.glob_buffer.extend(chunk, chunk_timestamps)
+        latencies.append(timed(main.glob_downsampler.update))
+
+    return {"catch_up_ms": catch_up, "per_chunk_ms": percentiles(latencies)}
+
+
+def bench_predictors():
+    """
+    latency of the plain predictors on raw windows, and of the live paths (infer_*) with one new chunk per call
+    """
+
+    raw = synthetic_signal(15 * main.expected_sfreq)[0].T[:len(main.expected_channels)]
+    focus = [timed(predict_focus, raw) for _ in range(n_runs)]
+    cogload = [timed(predict_cogload, raw[:, :4 * main.expected_sfreq]) for _ in range(n_runs)]
+
+    main.setup_pipeline(ch_names, sfreq)
+    samples, timestamps = synthetic_signal(int((20 + n_runs * chunk_seconds) * sfreq))
+    warm = 20 * sfreq
+    main.handle_eeg_chunk(samples[:warm], timestamps[:warm])
+    main.infer_focus()
+    main.infer_cogload()
+
+    infer_focus, infer_cogload = [], []
+    for chunk, chunk_timestamps in chunks(samples[warm:], timestamps[warm:]):
+        main.handle_eeg_chunk(chunk, chunk_timestamps)
+        infer_focus.append(timed(main.infer_focus))
+        infer_cogload.append(timed(main.infer_cogload))
+
+    return {
+        "predict_focus_ms": percentiles(focus),
+        "predict_cogload_ms": percentiles(cogload),
+        "infer_focus_ms": percentiles(infer_focus),
+        "infer_cogload_ms": percentiles(infer_cogload),
+    }
+
+
+def bench_data_route():
+    """
+    /data latency under concurrent clients, while a synthetic stream is fed in real time and the scheduler predicts
+    """
+
+    main.setup_pipeline(ch_names, sfreq)
+    stop_flag = threading.Event()
+
+    def feed():
+        next_chunk = time.perf_counter()
+        while not stop_flag.is_set():
+            main.handle_eeg_chunk(*synthetic_signal(int(sfreq * chunk_seconds), time.time()))
+            next_chunk += chunk_seconds
+            stop_flag.wait(max(0, next_chunk - time.perf_counter()))
+
+    # predictions need 15s of data, prefill the buffer instead of waiting for it
+    main.handle_eeg_chunk(*synthetic_signal(20 * sfreq, time.time() - 20))
+    feeder = threading.Thread(target=feed, name="synthetic-source", daemon=True)
+    feeder.start()
+    main.scheduler.start()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)     # no access log line per request
+    server = make_server("127.0.0.1", 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-server", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/data"
+
+    def client(_):
+        latencies = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    try:
+        report = {}
+        for n_clients in client_counts:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(n_clients) as pool:
+                latencies = [latency for latencies in pool.map(client, range(n_clients)) for latency in latencies]
+            elapsed = time.perf_counter() - start
+            report[str(n_clients)] = {"requests_per_s": len(latencies) / elapsed, **percentiles(latencies)}
+        return report
+    finally:
+        server.shutdown()
+        main.scheduler.stop()
+        stop_flag.set()
+
+
+benchmarks = {
+    "ingestion": bench_ingestion,
+    "downsampling": bench_downsampling,
+    "predictors": bench_predictors,
+    "data_route": bench_data_route,
+}
+
+
+# --- results
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def flatten(report:dict, prefix:str=""):
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def print_comparison(old:dict, new:dict):
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    print(f"\n--- compared to {old.get('commit')} ---")
+    for key, value in new_flat.items():
+        if key in old_flat and old_flat[key] and not key.endswith(".n"):
+            print(f"{key:<45}{old_flat[key]:>12.3f}{value:>12.3f}{(value / old_flat[key] - 1):>+9.1%}")
+
+
+if __name__ == "__main__":
+    # models are loaded up front, so the first predictions don't include loading them
+    main.warmup_models().join()
+
+    results = {}
+    for name, benchmark in benchmarks.items():
+        start = time.perf_counter()
+        results[name] = benchmark()
+        print(f"{name} done in {time.perf_counter() - start:.1f}s")
+
+    # ru_maxrss is in KB on linux
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "processor": platform.processor()},
+        "config": {"sfreq": sfreq, "n_channels": len(ch_names), "chunk_seconds": chunk_seconds, "n_runs": n_runs,
+                   "requests_per_client": requests_per_client},
+        "results": results,
+    }
+    with open(results_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"\ningestion     {results['ingestion']['samples_per_s']:.0f} samples/s")
+    print("downsampling  " + "   ".join(f"{seconds}s: {ms:.1f}ms" for seconds, ms in results["downsampling"]["catch_up_ms"].items())
+          + f"   per chunk p50 {results['downsampling']['per_chunk_ms']['p50']:.2f}ms")
+    for name, latency in results["predictors"].items():
+        print(f"{name:<22}p50 {latency['p50']:>8.2f}   p95 {latency['p95']:>8.2f}   p99 {latency['p99']:>8.2f}")
+    for n_clients, latency in results["data_route"].items():
+        print(f"/data {n_clients:>3} clients    p50 {latency['p50']:>8.2f}   p95 {latency['p95']:>8.2f}   p99 {latency['p99']:>8.2f}"
+              f"   {latency['requests_per_s']:.0f} req/s")
+    print(f"peak RSS      {results['peak_rss_mb']:.0f} MB")
+    print(f"results written to {results_path}")
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            print_comparison(json.load(f), report)
@@ -1,11 +1,17 @@
 import numpy as np
-from pylsl import StreamInlet, resolve_streams, local_clock
+from pylsl import StreamInlet, resolve_streams, cf_float32, cf_double64, cf_int32, cf_int16, cf_int8
 import time
 import threading
-import time
-
+from _clock import ClockSync
 
-conversion = time.time() - local_clock()  
+# dtypes pull_chunk can write into directly (via dest_obj), other formats (f.e. strings) are pulled as lists
+chunk_dtypes = {
+    cf_float32: np.float32,
+    cf_double64: np.float64,
+    cf_int32: np.int32,
+    cf_int16: np.int16,
+    cf_int8: np.int8,
+}
 
 
 def list_available_lsl_streams():
@@ -16,7 +22,22 @@ def list_available_lsl_streams():
         print(f"{i+1}. Name: {stream.name()}, Type: {stream.type()}, Channels: {stream.channel_count()}, Rate: {stream.nominal_srate()} Hz")
     return streams
 
-def start_eeg_stream(stream_index, handle_eeg=None, max_rate=128):
+def start_eeg_stream(stream_index, handle_eeg=None, max_rate=128, handle_eeg_chunk=None, max_chunk_seconds=1.0, pull_timeout=0.05, clock_sync_interval=5.0):
+    """
+    starts a daemon thread pulling from the selected stream, timestamps are converted to unix time
+    - handle_eeg_chunk(samples, timestamps) gets whole blocks: samples of shape (n_samples, n_channels), timestamps of shape (n_samples,)
+      samples is a view into a preallocated buffer that gets overwritten by the next pull, copy it if you need to keep it
+    - handle_eeg(sample, timestamp) is called per sample instead, if no chunk handler is given
+    
+    the thread blocks in pull_chunk until either max_chunk_seconds of data arrived or pull_timeout passed (instead of polling),
+    so at most 1/pull_timeout wake-ups per second happen regardless of sfreq and channel count
+    
+    the LSL -> unix time mapping is re-measured every clock_sync_interval seconds in the background and fitted with drift,
+    so timestamps stay aligned over long sessions (see _clock.py)
+    """
+    
+    if handle_eeg is None and handle_eeg_chunk is None:
+        raise ValueError("need either handle_eeg or handle_eeg_chunk")
     
     # -- finding stream
     all_streams = resolve_streams()
@@ -50,10 +71,16 @@ def start_eeg_stream(stream_index, handle_eeg=None, max_rate=128):
     
     stop_flag = threading.Event()
     
+    # -- preallocated destination for pull_chunk, big enough for max_chunk_seconds of data (at least one sample)
+    max_samples = max(int((sfreq or max_rate) * max_chunk_seconds), 1)
+    dtype = chunk_dtypes.get(info.channel_format())
+    chunk_buffer = np.zeros((max_samples, ch_count), dtype=dtype) if dtype is not None else None
+    
     result = {
         'stop_flag': stop_flag,
         'ch_names': ch_names,
         'sfreq': sfreq,
+        'clock': ClockSync(inlet, interval=clock_sync_interval),    # .offset() / .stats() of the LSL -> unix time mapping
     }
     
 
@@ -77,16 +104,27 @@ def start_eeg_stream(stream_index, handle_eeg=None, max_rate=128):
         #         # Sleep a bit to avoid consuming too much CPU
         #         time.sleep(0.001)
                
-        time_correction = inlet.time_correction()
+        clock = result['clock']
+        clock.start()
                
         while not stop_flag.is_set():
-            sample, timestamp = inlet.pull_sample(timeout=0.0)
+            # blocks until the destination is full or the timeout passed, returns whatever arrived in between
+            if chunk_buffer is not None:
+                _, timestamps = inlet.pull_chunk(timeout=pull_timeout, max_samples=max_samples, dest_obj=chunk_buffer)
+                samples = chunk_buffer[:len(timestamps)]
+            else:
+                samples, timestamps = inlet.pull_chunk(timeout=pull_timeout, max_samples=max_samples)
             
-            if sample:
-                timestamp = timestamp + time_correction + conversion
-                handle_eeg(sample, timestamp)
-                
-            time.sleep(0.001)
+            if len(timestamps) == 0:
+                continue
+            
+            timestamps = clock.to_unix(np.asarray(timestamps, dtype=np.float64))
+            
+            if handle_eeg_chunk:
+                handle_eeg_chunk(samples, timestamps)
+            else:
+                for sample, timestamp in zip(samples, timestamps):
+                    handle_eeg(sample, timestamp)
     
   
     thread = threading.Thread(target=streaming_thread)
@@ -99,11 +137,11 @@ if __name__ == "__main__":
     streams = list_available_lsl_streams()
     
     if streams:
-        def test_handler(buffer, sfreq, real_channels):
-            print(f"streamed at {sfreq} for {real_channels}, Buffer size: {len(buffer)} samples")
+        def test_handler(samples, timestamps):
+            print(f"received chunk of {len(samples)} samples, {timestamps[0]:.3f} - {timestamps[-1]:.3f}")
         
         stream_idx = int(input("Enter stream number: ")) - 1
-        stream_info = start_eeg_stream(stream_index=stream_idx, handle_eeg=test_handler)
+        stream_info = start_eeg_stream(stream_index=stream_idx, handle_eeg_chunk=test_handler)
         
         try:
             while True:
@@ -1,13 +1,29 @@
-from flask import Flask, jsonify, render_template, render_template_string, request
-import dotenv
 import time
-from _models import predict_cogload, predict_focus
+boot_start = time.perf_counter()    # everything below counts into the startup breakdown
+
+from flask import Flask, Response, jsonify, render_template, render_template_string, request
+import dotenv
+import json
+from _models import predict_cogload_transformed, predict_focus_features, warmup_models, registry, scaler, clf
 from lsl_read import list_available_lsl_streams, start_eeg_stream
 import numpy as np
-from _helpers import softmax, find_closest_timestamp_index
-from scipy import signal
+from _helpers import softmax, find_timestamp_ranges
+from _buffer import RingBuffer
+from _resample import StreamingDownsampler
+from _features import FocusFeatureEngine
+from _cwt import cwt_spectrum
+from _inference import LatestResults, InferenceScheduler
+from _jobs import Jobs
+from _store import FeatureStore, focus_rows, cogload_rows
+from _recorder import SessionRecorder
+from _metrics import metrics, stage_time
+from _quality import StreamMonitor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import os
 
+startup_times = {"imports": time.perf_counter() - boot_start}     # seconds per startup step, printed at boot
+
 
 # --- envs
 dotenv.load_dotenv()
@@ -18,16 +34,61 @@ started = time.time()
 expected_channels = ['F7','F3','P7','O1','O2','P8','F4']
 expected_sfreq = 128  
 
-glob_buffer = []
-glob_timestamps = []
+glob_buffer:RingBuffer = None    # created once the stream info (channel count, sfreq) is known
+glob_downsampler:StreamingDownsampler = None    # only needed if glob_sfreq != expected_sfreq
+glob_focus_engine:FocusFeatureEngine = None     # caches focus spectra between /data calls
 glob_channel_idxs = []
 glob_sfreq = 128
+glob_monitor:StreamMonitor = None  # gaps, bursts and jitter of the incoming timestamps, see _quality.py
+
+interpolate_gap_seconds = float(os.getenv("INTERPOLATE_GAP_SECONDS", 0.1))    # shorter gaps are filled, 0 never fills
+min_prediction_coverage = float(os.getenv("MIN_PREDICTION_COVERAGE", 0.9))    # predictors skip windows with fewer real samples
+
+feature_store = FeatureStore("./collected_data/features")   # precomputed features of everything calibration saves
+default_subject = os.getenv("SUBJECT", "default")   # calibration requests can name their own subject
+
+glob_recorder:SessionRecorder = None    # raw copy of the whole session on disk, see _recorder.py
+record_sessions = os.getenv("RECORD_SESSIONS", "true").lower() in ("1", "true", "yes")
+sessions_dir = os.getenv("SESSIONS_DIR", "./collected_data/sessions")
+
+
+# --- metrics, rendered by /metrics (see _metrics.py) - the models time themselves in _models.py
+late_chunk_seconds = 1.0    # chunks arriving later than this after their newest sample count as late
+rate_window_seconds = 10    # the received samples/s gauge averages over this many seconds
+
+ingest_time = stage_time("ingest")
+downsample_time = stage_time("downsample")
+focus_features_time = stage_time("focus_features")
+cogload_features_time = stage_time("cogload_features")
+serialize_time = stage_time("serialize")
+samples_received = metrics.counter("eeg_samples_received", "samples handed over by the LSL thread")
+chunk_lag = metrics.histogram("eeg_chunk_lag_seconds", "arrival time minus the timestamp of the newest sample, per chunk",
+                              buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+late_chunks = metrics.counter("eeg_late_chunks", f"chunks arriving more than {late_chunk_seconds}s after their newest sample")
 
 
 
 
 # --- callibration shit
-def handle_focus_calibration(buffer:list, timestamps:list, sfreq:float, channel_idxs:list, start_callibration_timestamp:float):
+def next_recording_index(base_dir:str):
+    """
+    one higher than the highest {idx}_*.npy in base_dir (counting files would reuse indices once some get deleted)
+    """
+    idxs = [int(fname.split("_")[0]) for fname in os.listdir(base_dir) if fname.endswith(".npy") and fname.split("_")[0].isdigit()]
+    return max(idxs, default=-1) + 1
+
+
+def wait_for_samples(end_timestamp:float, timeout:float):
+    """
+    blocks the writer thread until the ingestion thread wrote everything up to end_timestamp into the raw buffer,
+    plus what the downsampler needs to produce its outputs up to there - False on timeout
+    """
+    
+    delay = glob_downsampler.delay_seconds if glob_downsampler else 0
+    return glob_buffer.wait_for_timestamp(end_timestamp + delay, timeout=timeout)
+
+
+def handle_focus_calibration(buffer:np.ndarray, timestamps:np.ndarray, sfreq:float, channel_idxs:list, start_callibration_timestamp:float, subject:str=None):
     """
     expects an already downsampled buffer with at least 86 seconds filled of expected_sfreq - channel_idxs to identify what is where
     
@@ -39,135 +100,323 @@ def handle_focus_calibration(buffer:list, timestamps:list, sfreq:float, channel_
     """
     
 
-    start_index = find_closest_timestamp_index(timestamps, start_callibration_timestamp)
-    f_start = start_index + (3*sfreq)
-    f_end = start_index + (43*sfreq)
-    u_start = start_index + (46*sfreq)
-    u_end = start_index + (86*sfreq)
+    # both 40s parts in one lookup, each from the sample closest to its own start (so a gap in between doesn't shift the second)
+    # and cut by time, so a gap inside a part makes it shorter instead of running on into the pause after it
+    (f_start, u_start), (f_end, u_end) = find_timestamp_ranges(
+        timestamps, [start_callibration_timestamp + 3, start_callibration_timestamp + 46], 40, sfreq)
+    
+    # the coverage check only looks at the whole 86s, a gap of a few seconds in one part still passes it
+    for name, start_index, end_index in (("focused", f_start, f_end), ("unfocused", u_start, u_end)):
+        if end_index - start_index != int(40*sfreq):
+            raise Exception(f"{name} part has {end_index - start_index} of {int(40*sfreq)} samples, not saving a truncated window")
     
-    focused_buffer = np.array(buffer[f_start:f_end]).T[channel_idxs]
-    unfocused_buffer = np.array(buffer[u_start:u_end]).T[channel_idxs]
+    focused_buffer = buffer[f_start:f_end].T[channel_idxs]
+    unfocused_buffer = buffer[u_start:u_end].T[channel_idxs]
     
     base_dir = "./collected_data/focus"
-    idx = len([fname for fname in os.listdir() if (fname.endswith(".npy"))])
+    idx = next_recording_index(base_dir)
     np.save(f"{base_dir}/{idx}_focused.npy", focused_buffer)
     np.save(f"{base_dir}/{idx}_unfocused.npy", unfocused_buffer)
     print(f"--- saving shapes: {focused_buffer.shape}, {unfocused_buffer.shape}")
     
+    # features once at save time, so finetuning reads them from the store instead of recomputing
+    for raw, raw_timestamps, label in ((focused_buffer, timestamps[f_start:f_end], "focused"), (unfocused_buffer, timestamps[u_start:u_end], "unfocused")):
+        features, feature_timestamps = focus_rows(raw, raw_timestamps, sfreq)
+        feature_store.add("focus", features, feature_timestamps, subject or default_subject, idx, label, source=f"{idx}_{label}.npy")
+    
+    return {"session": idx, "focused_shape": focused_buffer.shape, "unfocused_shape": unfocused_buffer.shape}
+    
     
-def handle_cogload_calibration(buffer:list, timestamps:list, sfreq:float, channel_idxs:list, clips_infos:list):
+def handle_cogload_calibration(buffer:np.ndarray, timestamps:np.ndarray, sfreq:float, channel_idxs:list, clips_infos:list, subject:str=None):
     """
     array with item for each clip, holding unix-time of its start (end can be calculated) and its label
     """
     
-    for i, clip_info in enumerate(clips_infos):
-        start_index = find_closest_timestamp_index(timestamps, clip_info["start_time"])
-        end_index = start_index + (sfreq*30) # match the frontend, since each clip is shown this many seconds
+    # all clips in one lookup, 30s each to match the frontend, since each clip is shown this many seconds
+    start_idxs, end_idxs = find_timestamp_ranges(timestamps, [clip_info["start_time"] for clip_info in clips_infos], 30, sfreq)
+    
+    # checked for all clips before the first one is saved, like the focus parts
+    for clip_info, start_index, end_index in zip(clips_infos, start_idxs, end_idxs):
+        if end_index - start_index != int(sfreq*30):
+            raise Exception(f"clip starting at {clip_info['start_time']} has {end_index - start_index} of {int(sfreq*30)} samples, "
+                            "not saving a truncated window")
+    
+    saved = []
+    for clip_info, start_index, end_index in zip(clips_infos, start_idxs, end_idxs):
         label = clip_info["answer"]
-        clip_buffer = np.array(buffer[start_index:end_index]).T[channel_idxs]
+        clip_buffer = buffer[start_index:end_index].T[channel_idxs]
         
         
         base_dir = "./collected_data/cogload"
-        idx = len([fname for fname in os.listdir() if (fname.endswith(".npy"))])
+        idx = next_recording_index(base_dir)
         np.save(f"{base_dir}/{idx}_{label}.npy", clip_buffer)
         print(f"--- saving shape: {clip_buffer.shape}")
+        
+        tensors, tensor_timestamps = cogload_rows(clip_buffer, timestamps[start_index:end_index], sfreq)
+        feature_store.add("cogload", tensors, tensor_timestamps, subject or default_subject, idx, label, source=f"{idx}_{label}.npy")
+        saved.append({"session": idx, "label": label, "shape": clip_buffer.shape})
+    
+    return saved
 
 
 # --- downsampling shit
-minimum_displayed_freq = 0.5    # in Hz
-minimum_length_for_downsampling = 10 * (1 / minimum_displayed_freq)    # 20 seconds, has to be multiplied by the frequency to get the actual time steps
+def get_downsampled_buffer() -> RingBuffer:
+    """
+    ring buffer at expected_sfreq - the raw one if the headset already streams at it,
+    otherwise the streaming downsampler is first caught up with the samples that arrived since the last call
+    """
     
-def down_sample_if_needed(input_buffer, source_sfreq, target_sfreq, timestamps=None):
+    if glob_downsampler is None:
+        return glob_buffer
+    
+    with downsample_time.time():
+        glob_downsampler.update()
+    return glob_downsampler.output
+
+
+# --- pipeline setup, once the stream info (channel names, sfreq) is known - also used by replay.py
+def setup_pipeline(ch_names:list, sfreq:float, max_seconds:float=180):
     """
-    needs certain length and must be higher than target sfreq
+    creates the raw ring buffer, the downsampler if needed and the feature caches the predictors read from
+    """
+    
+    global glob_sfreq, glob_buffer, glob_downsampler, glob_channel_idxs, glob_focus_engine, glob_monitor
     
+    glob_sfreq = sfreq
+    glob_buffer = RingBuffer(len(ch_names), glob_sfreq, max_seconds=max_seconds)
+    glob_monitor = StreamMonitor(glob_sfreq, interpolate_seconds=interpolate_gap_seconds)
+    glob_downsampler = None
+    if glob_sfreq != expected_sfreq:
+        glob_downsampler = StreamingDownsampler(glob_buffer, expected_sfreq, max_seconds=max_seconds)
+    
+    if ch_names == ['', '', '', '', '', '', '', '']:
+        ch_names = ['F7','F3','P7','O1','O2','P8','F4']
+    
+    # check if all expected channels exist (we can have more than needed, no problem - will be filtered out by the use of indexes)
+    glob_channel_idxs = []
+    for channel in expected_channels:
+        if channel in ch_names:
+            glob_channel_idxs.append(ch_names.index(channel))
+        else:
+            raise Exception(f"{channel} missing in real_channels: {ch_names}")
+    
+    glob_focus_engine = FocusFeatureEngine(glob_downsampler.output if glob_downsampler else glob_buffer, glob_channel_idxs, expected_sfreq)
+
+
+# --- main handling function, passed to subthread
+def handle_eeg(sample, timestamp):
     """
+    only called when sample is not None
+    timestamp is in unix time
+    """
+    
+    global glob_buffer
+    
+    # print(timestamp)
+    
+    # samples arriving before the stream info was processed are dropped
+    if glob_buffer is None:
+        return
+    
+    # --- constantly append to the ring buffer (sliding window of the last 180 seconds, oldest samples get overwritten)
+    samples_received.inc()
+    if glob_recorder is not None:
+        glob_recorder.record([sample], [timestamp])
+    glob_buffer.extend(*glob_monitor.process([sample], [timestamp]))
+
 
-    if source_sfreq < target_sfreq:
-        raise Exception(f"{source_sfreq} is smaller than target sfreq of {target_sfreq}")
+def handle_eeg_chunk(samples, timestamps):
+    """
+    chunked version of handle_eeg - samples of shape (n_samples, n_channels), timestamps in unix time
+    """
     
+    global glob_buffer
     
-    # no need if same
-    if source_sfreq == target_sfreq:
-        return input_buffer, timestamps
+    if glob_buffer is None:
+        return
     
+    lag = time.time() - timestamps[-1]
+    samples_received.inc(len(timestamps))
     
-    # check if minimum length on nyqiom theorem has been reached
-    if len(input_buffer) >= (minimum_length_for_downsampling * source_sfreq):
-        downsampled_buffer = down_sample(input_buffer, source_sfreq, target_sfreq)
-        
-        # -- downsample timestamps simply by skipping (TODO: could pool them)
-        downsample_factor = source_sfreq / target_sfreq
-        indices_to_keep = []
-        for i in range(int(len(timestamps) / downsample_factor)):
-            idx = int(i * downsample_factor)
-            if idx < len(timestamps):
-                indices_to_keep.append(idx)
-        downsampled_timestamps = [timestamps[i] for i in indices_to_keep]
-        
-        return downsampled_buffer, downsampled_timestamps
+    with ingest_time.time():
+        # the recorder keeps what arrived, the ring buffer gets it checked and with short gaps filled
+        if glob_recorder is not None:
+            glob_recorder.record(samples, timestamps)
+        glob_buffer.extend(*glob_monitor.process(samples, timestamps))
     
-    else:
-        print(f"{len(glob_buffer) / glob_sfreq} seconds too short for downsample, skipping...")
-        return None
+    chunk_lag.observe(lag)
+    if lag > late_chunk_seconds:
+        late_chunks.inc()
+
+
+# --- inference, run by the scheduler in the background (each model at its own cadence)
+focus_interval = float(os.getenv("FOCUS_INTERVAL", 0.5))       # in seconds
+cogload_interval = float(os.getenv("COGLOAD_INTERVAL", 2.0))   # in seconds
 
+results = LatestResults()
+scheduler = InferenceScheduler(results)
+refused_predictions = {
+    name: metrics.counter("predictions_refused", "windows not scored because too many samples were missing", model=name)
+    for name in ("focus", "cogload")
+}
 
-def down_sample(buffer, source_sfreq:float, target_sfreq:float):
+
+def window_coverage(seconds:float):
     """
-    takes:
-    - buffer of shape (n_channels, n_samples) - n_samples has to be at least minimum_length_for_downsampling (otherwise not accurate, or might even throw error because impossible)
-    - source_sfreq - lower than the target_sfeq defined in "expected_sfreq" global variable
+    fraction of real (received, not interpolated) samples in the latest `seconds` of the stream
     """
     
-    if source_sfreq <= target_sfreq:
-        raise Exception(f"source frequency {source_sfreq} must be higher than the target frequency of {target_sfreq}")
-    
-    if len(buffer) <= (minimum_length_for_downsampling * source_sfreq):
-        raise Exception(f"input sample length must be at least {minimum_length_for_downsampling} seconds")
+    end = glob_buffer.latest_timestamp
+    return glob_monitor.coverage(glob_buffer, end - seconds, end)
+
+
+def infer_focus():
+    """
+    needs 15 seconds - returns probability of being focused, None if not enough data yet or too much of it is missing
+    """
     
-    buffer = np.array(buffer).T
+    buffer = get_downsampled_buffer() if glob_buffer is not None else None
+    if buffer is None or buffer.seconds_filled < 15:
+        return None
+    if window_coverage(15) < min_prediction_coverage:
+        refused_predictions["focus"].inc()
+        return None
     
     start = time.perf_counter()
+
+    # only the 1s windows that completed since the last call get computed
+    with focus_features_time.time():
+        glob_focus_engine.update()
+        features, _ = glob_focus_engine.features()
     
-    down_factor = source_sfreq / target_sfreq
+    prob = predict_focus_features(features)
+    pred = prob >= 0.5
     
-    nyquist = source_sfreq / 2.0  # 125 Hz
-    cutoff = target_sfreq / 2.0 * 0.9  # 57.6 Hz (90% of new Nyquist)
-    b, a = signal.butter(8, cutoff/nyquist, 'low')
+    end = time.perf_counter()
+    # print(f"predicted focus {pred} ({prob}% of it being focused) in: {(end - start) * 1000:.3f} ms")
+    return prob
+
 
-    filtered_data = signal.filtfilt(b, a, buffer, axis=1)
-    new_length = int(buffer.shape[1] / down_factor)
+def infer_cogload():
+    """
+    needs 4 seconds - returns probability of high cognitive load, None if not enough data yet or too much of it is missing
+    """
+    
+    buffer = get_downsampled_buffer() if glob_buffer is not None else None
+    if buffer is None or buffer.seconds_filled < 4:
+        return None
+    if window_coverage(4) < min_prediction_coverage:
+        refused_predictions["cogload"].inc()
+        return None
     
-    downsampled_data = signal.resample(filtered_data, new_length, axis=1)
+    start = time.perf_counter()
+    samples, _ = buffer.last_seconds(4)
+    data = samples.T[glob_channel_idxs]
     
-    print(f"reduced length of samples from {buffer.shape[1]} to {downsampled_data.shape[1]}")
+    # the whole window is transformed every time, like the model saw it in training
+    with cogload_features_time.time():
+        scalogram = cwt_spectrum(data)
     
-    output_buffer = downsampled_data.T.tolist()
+    logits = predict_cogload_transformed(scalogram)
+    probs = softmax(logits)
     
     end = time.perf_counter()
-    # print(f"downsampled in: {(end - start) * 1000:.3f} ms")
-    return output_buffer
+    # print(f"predicted cognitive load {probs[0][1]} (1=high) in: {(end - start) * 1000:.3f} ms")
+    return probs[0][1]
 
 
-# --- main handling function, passed to subthread
-def handle_eeg(sample, timestamp):
+scheduler.add_task("focus", infer_focus, focus_interval)
+scheduler.add_task("cogload", infer_cogload, cogload_interval)
+
+
+# --- ingestion health and prediction gauges, computed when /metrics is scraped
+def received_samples_per_second():
+    if glob_buffer is None:
+        return None
+    
+    _, timestamps = glob_buffer.latest(int(2 * rate_window_seconds * glob_buffer.sfreq))
+    return (len(timestamps) - np.searchsorted(timestamps, time.time() - rate_window_seconds)) / rate_window_seconds
+
+def buffer_fill():
+    if glob_buffer is None:
+        return None
+    return len(glob_buffer) / glob_buffer.capacity
+
+
+metrics.gauge("eeg_samples_per_second", f"samples received per second, averaged over {rate_window_seconds}s", fn=received_samples_per_second)
+metrics.gauge("eeg_buffer_fill_ratio", "filled fraction of the raw ring buffer", fn=buffer_fill)
+metrics.gauge("session_recorder_dropped_chunks", "chunks the session recorder dropped because its queue was full",
+              fn=lambda: glob_recorder.dropped_chunks if glob_recorder is not None else None)
+metrics.counter("eeg_gaps", "gaps in the incoming timestamps", fn=lambda: glob_monitor.gaps)
+metrics.counter("eeg_missing_samples", "samples missing in those gaps", fn=lambda: glob_monitor.missing_samples)
+metrics.counter("eeg_interpolated_samples", "missing samples filled by interpolation", fn=lambda: glob_monitor.interpolated_samples)
+metrics.counter("eeg_burst_samples", "samples arriving much closer together than the sample period", fn=lambda: glob_monitor.burst_samples)
+metrics.counter("eeg_dropped_samples", "samples dropped because their timestamp went backwards", fn=lambda: glob_monitor.dropped_samples)
+metrics.gauge("eeg_timestamp_jitter_seconds", "moving average of |interval - sample period|", fn=lambda: glob_monitor.jitter)
+metrics.gauge("eeg_coverage_ratio", "fraction of real samples in the latest 15s", fn=lambda: window_coverage(15))
+for name in ("focus", "cogload"):
+    metrics.gauge("prediction_age_seconds", "seconds since the last published prediction", fn=lambda name=name: results.get(name)[1], model=name)
+
+
+# --- finetuning, in a separate process so fitting never blocks the webserver (spawn, forking a threaded process is unsafe)
+finetune_method = os.getenv("FOCUS_FINETUNE", "refit")     # "refit" the svm on everything, or "online" (OnlineFocusClassifier)
+finetune_jobs = Jobs(lambda: ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")))
+
+
+# --- calibration persistence, one writer thread so requests return right away and disk writes never stall inference
+calibration_timeout = 10    # seconds to wait for the last samples of a calibration
+min_calibration_coverage = 0.95     # refuse to save calibrations with more samples missing than this
+calibration_writer = Jobs(lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix="calibration-writer"))
+
+
+def capture_calibration(start_timestamp:float, end_timestamp:float):
     """
-    only called when sample is not None
-    timestamp is in unix time
+    waits until all samples up to end_timestamp arrived and returns the (caught up) downsampled ring
+    - raises instead of saving a truncated recording, if they don't arrive in time or too many are missing
     """
     
-    global glob_buffer, glob_sfreq, glob_timestamps
+    arrived = wait_for_samples(end_timestamp, calibration_timeout)
+    ring = get_downsampled_buffer()
+    # real samples only - interpolated gaps are fine to predict across, but not to train on
+    coverage = min(ring.coverage(start_timestamp, end_timestamp), glob_monitor.coverage(glob_buffer, start_timestamp, end_timestamp))
     
-    # print(timestamp)
+    if not arrived:
+        raise Exception(f"samples up to the end of the calibration didn't arrive within {calibration_timeout}s (coverage {coverage:.0%})")
+    if coverage < min_calibration_coverage:
+        raise Exception(f"only {coverage:.0%} of the calibration's samples are in the buffer, need {min_calibration_coverage:.0%}")
+    return ring
+
+
+def save_focus_calibration(start_callibration_timestamp:float, subject:str=None):
+    """
+    runs in the writer thread - waits for the data, downsamples, cuts the 86s after the start out of the ring,
+    saves and starts finetuning
+    """
+    
+    ring = capture_calibration(start_callibration_timestamp, start_callibration_timestamp + 86)
+    (buffer, timestamps), = ring.ranges([start_callibration_timestamp], 86)
+    result = handle_focus_calibration(buffer, timestamps, expected_sfreq, glob_channel_idxs, start_callibration_timestamp, subject)
+    result["coverage"] = ring.coverage(start_callibration_timestamp, start_callibration_timestamp + 86)
     
-    # --- constantly append to buffer global variable (sliding window)
-    glob_buffer.append(sample)
-    glob_timestamps.append(timestamp)
+    # the new model gets published to the registry and swapped in by it, the page polls /jobs/<id> meanwhile
+    from _finetune import finetune_focus    # imported here, sklearn is not needed before the first calibration
+    result["finetune_job"] = finetune_jobs.submit("finetune_focus", finetune_focus, scaler.get(), clf.get(), registry.models_dir,
+                                                  sfreq=expected_sfreq, method=finetune_method, store_root=feature_store.root)
+    return result
 
-    max_buffer_length = 180 # in seconds
-    if len(glob_buffer) > (glob_sfreq * max_buffer_length):
-        glob_buffer[:] = glob_buffer[-(int(glob_sfreq * max_buffer_length)):]
-        glob_timestamps[:] = glob_timestamps[-(int(glob_sfreq * max_buffer_length)):]
+
+def save_cogload_calibration(clips_infos:list, subject:str=None):
+    """
+    runs in the writer thread - one region from the first clip's start to the last clip's end
+    """
+    
+    clip_seconds = 30   # match the frontend, since each clip is shown this many seconds
+    first_start = min(clip_info["start_time"] for clip_info in clips_infos)
+    last_start = max(clip_info["start_time"] for clip_info in clips_infos)
+    
+    ring = capture_calibration(first_start, last_start + clip_seconds)
+    (buffer, timestamps), = ring.ranges([first_start], last_start - first_start + clip_seconds)
+    return handle_cogload_calibration(buffer, timestamps, expected_sfreq, glob_channel_idxs, clips_infos, subject)
 
 
 # --- init
@@ -178,54 +427,82 @@ app = Flask(__name__)
 # --- routes
 @app.get("/data")
 def dataRoute():
-    global glob_buffer, glob_channel_idxs, glob_sfreq
-    
-    if len(glob_buffer) < glob_sfreq*15:
-        print("--not long enough for inference inference--")
-        return jsonify({
-            "cogload": str(0),
-            "focus": str(0)
-        })
+    """
+    only reads the latest published predictions, ages are in seconds (None until the first prediction)
+    """
     
+    focus, focus_age = results.get("focus")
+    cogload, cogload_age = results.get("cogload")
     
-    buffer, _ = down_sample_if_needed(glob_buffer, glob_sfreq, expected_sfreq)
-    if buffer == None:
-        print("--not long enough for downsampling--")
+    with serialize_time.time():
         return jsonify({
-            "cogload": str(0),
-            "focus": str(0)
+            "cogload": str(cogload or 0), # between 0 and 1 (corresponds to 100% and 200% video speed)
+            "focus": str(focus or 0), # between 0 and 1 (corresponds to completely drowsy vs full focus)
+            "cogload_age": cogload_age,
+            "focus_age": focus_age,
         })
-    
-    # --- needs 15 seconds
-    start = time.perf_counter()
 
-    data = np.array(buffer[int(-expected_sfreq*15):]).T[glob_channel_idxs]
-    
-    prob = predict_focus(data, expected_sfreq)
-    pred = prob >= 0.5
-    
-    focus = prob
-    
-    end = time.perf_counter()
-    # print(f"predicted focus {pred} ({prob}% of it being focused) in: {(end - start) * 1000:.3f} ms")
-        
-    # --- needs 4 seconds
-    start = time.perf_counter()
-    data = np.array(buffer[int(-expected_sfreq*4):]).T[glob_channel_idxs]
-    
-    logits = predict_cogload(data, expected_sfreq)
-    probs = softmax(logits)
+
+@app.get("/stream")
+def stream_route():
+    """
+    server-sent events, pushed as soon as the scheduler publishes - one event per model ("focus", "cogload")
+    with data {"value": ..., "age": ...}, the latest values are sent right after connecting
+    """
     
-    cogload = probs[0][1]
+    keepalive_interval = 15 # in seconds, lets us notice closed connections
     
-    end = time.perf_counter()
-    # print(f"predicted cognitive load {probs[0][1]} (1=high) in: {(end - start) * 1000:.3f} ms")
+    def events():
+        version = 0
+        while True:
+            changed, version = results.published_since(version)
+            
+            for name, (value, age) in changed.items():
+                yield f"event: {name}\ndata: {json.dumps({'value': float(value), 'age': age})}\n\n"
+            
+            if results.wait_for_update(version, timeout=keepalive_interval) == version:
+                yield ": keepalive\n\n"
     
-    return jsonify({
-        "cogload": str(cogload), # between 0 and 1 (corresponds to 100% and 200% video speed)
-        "focus": str(focus) # between 0 and 1 (corresponds to completely drowsy vs full focus)
-    })
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/jobs/<job_id>")
+def job_route(job_id):
+    """
+    status of a background job (saving a calibration, finetuning after it): queued, running, done (with result) or failed (with error)
+    """
     
+    job = calibration_writer.status(job_id) or finetune_jobs.status(job_id)
+    if job is None:
+        return {"msg": f"unknown job {job_id}"}, 404
+    return jsonify(job)
+
+
+@app.get("/metrics")
+def metrics_route():
+    """
+    stage timings, ingestion health and prediction ages in the Prometheus text format
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/models")
+def models_route():
+    """
+    serving, previous and available versions per model of the registry
+    """
+    return jsonify(registry.status())
+
+@app.post("/models/<name>/rollback")
+def models_rollback_route(name):
+    if name not in registry.status():
+        return {"msg": f"unknown model {name}"}, 404
+    
+    if not registry.rollback(name):
+        return {"msg": f"no previous version of {name} loaded"}, 409
+    return jsonify(registry.status()[name])
+
+
 @app.get("/")
 def home_route():
     return render_template_string("""
@@ -265,19 +542,12 @@ def focus_calibration_client_route():
     
     # this is the POST endpoint to callibrate
     # we receive the timestamp of when the callibration happened on the frontend (in unix time)
-    # and have to match it to the right chunk inside our buffer
-    global glob_buffer, glob_timestamps, glob_sfreq, glob_channel_idxs, expected_sfreq
+    # and have to match it to the right chunk inside our buffer - done by the writer thread, we only return its job id
     print("received calibration request")
     
     data = request.get_json()
-    start_callibration_timestamp = data["calibration_start"]
-    time.sleep(2)
-    
-    
-    # must be len(glob_buffer) >= int(glob_sfreq * 86)
-    buffer, timestamps = down_sample_if_needed(glob_buffer, glob_sfreq, expected_sfreq, glob_timestamps)
-    handle_focus_calibration(buffer, timestamps, expected_sfreq, glob_channel_idxs, start_callibration_timestamp)
-    return {"msg": "succesfully calibrated"}, 200
+    job_id = calibration_writer.submit("save_focus_calibration", save_focus_calibration, data["calibration_start"], data.get("subject"))
+    return {"msg": "saving calibration", "job": job_id}, 202
 
         
 @app.route("/cogload_calibration", methods=["GET", "POST"])
@@ -293,39 +563,48 @@ def cogload_calibration_client_route():
     clips_infos = request.get_json()
     print(clips_infos)
     
-    buffer, timestamps = down_sample_if_needed(glob_buffer, glob_sfreq, expected_sfreq, glob_timestamps)
-    handle_focus_calibration(buffer, timestamps, expected_sfreq, glob_channel_idxs, clips_infos)
-    
-    return {"msg": "succesfully calibrated"}, 200
+    job_id = calibration_writer.submit("save_cogload_calibration", save_cogload_calibration, clips_infos, request.args.get("subject"))
+    return {"msg": "saving calibration", "job": job_id}, 202
     
 
 
 
 # --- running
+def print_startup_times():
+    print("\n--- startup ---")
+    for step, seconds in startup_times.items():
+        print(f"{step:<20}{seconds:>8.2f}s")
+    print("(models are loaded in the background and report when they are warm)")
+    print("---------------\n")
+
+
 if __name__ == "__main__":
+    step_start = time.perf_counter()
     streams = list_available_lsl_streams()
+    startup_times["stream discovery"] = time.perf_counter() - step_start
     
     if not streams:
         print("No LSL streams found. Make sure your devices are connected and streaming.")
         exit()
 
     stream_idx = int(input("Enter the number of the stream you want to capture: ")) - 1
-    stream_info = start_eeg_stream(stream_idx, handle_eeg=handle_eeg, max_rate=128)
     
+    step_start = time.perf_counter()
+    stream_info = start_eeg_stream(stream_idx, handle_eeg_chunk=handle_eeg_chunk, max_rate=128)
+    startup_times["stream connect"] = time.perf_counter() - step_start
+    metrics.gauge("lsl_clock_offset_seconds", "offset added to LSL timestamps to get unix time", fn=lambda: stream_info["clock"].offset())
+    metrics.gauge("lsl_clock_drift_ppm", "fitted drift of that offset", fn=lambda: stream_info["clock"].stats()["drift_ppm"])
+    metrics.gauge("lsl_clock_residual_seconds", "spread of the offset measurements around the fit", fn=lambda: stream_info["clock"].stats()["residual_ms"] / 1000)
+    step_start = time.perf_counter()
     
-    # --
-    glob_sfreq = stream_info["sfreq"]
-    ch_names = stream_info["ch_names"]
     
-    if ch_names == ['', '', '', '', '', '', '', '']:
-        ch_names = ['F7','F3','P7','O1','O2','P8','F4']
-    
-    # check if all expected channels exist (we can have more than needed, no problem - will be filtered out by the use of indexes)
-    for channel in expected_channels:
-        if channel in ch_names:
-            glob_channel_idxs.append(ch_names.index(channel))
-        else:
-            raise Exception(f"{channel} missing in real_channels: {ch_names}")
+    # --
+    setup_pipeline(stream_info["ch_names"], stream_info["sfreq"])
+    if record_sessions:
+        glob_recorder = SessionRecorder(stream_info["ch_names"], glob_sfreq, root=sessions_dir)
+        glob_recorder.start()
+        print(f"recording session to {glob_recorder.path}")
+    startup_times["buffers"] = time.perf_counter() - step_start
     # --
     
     
@@ -345,8 +624,24 @@ if __name__ == "__main__":
     #     stream_info['stop_flag'].set()
     #     raise Exception(f"{str(real_sfreq)} is not as expected")
     
+    # models load in the background, predictions that come first just wait for them
+    warmup_models()
+    registry.start()
+    print_startup_times()
+    
+    print("starting inference scheduler")
+    scheduler.start()
+    
     print("starting webserver")
-    app.run(host="127.0.0.1", port=8080, debug=False)
+    app.run(host="127.0.0.1", port=8080, debug=False, threaded=True)
     
     print("flask exited, closing stream connection")
+    stream_info["clock"].stop()
+    scheduler.stop()
+    registry.stop()
+    calibration_writer.shutdown()
+    finetune_jobs.shutdown()
+    if glob_recorder is not None:
+        glob_recorder.stop()
+        print(f"session recorded to {glob_recorder.path} ({glob_recorder.written_samples} samples, {glob_recorder.dropped_chunks} chunks dropped)")
     stream_info['stop_flag'].set()
\ No newline at end of file
@@ -0,0 +1,174 @@
+# --- builds the quantized / half precision variants of inference.onnx and compares them against fp32
+# python optimize_model.py [variants...]    (default: int8_dynamic int8_static fp16)
+# needs the onnx and onnxconverter-common packages on top of onnxruntime, only for this script
+# select the result with COGLOAD_MODEL_VARIANT in .env - variants that fail the accuracy gate (or aren't in
+# model_report.json) are not loaded, the server falls back to fp32
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from _cwt import cwt_spectrum
+from _helpers import softmax
+from _onnx import OnnxModel, variant_path, report_path
+
+
+onnx_path = "./inference.onnx"
+data_dir = "./collected_data/cogload"   # (7, samples) clips saved by the cogload calibration
+
+sfreq = 128
+window_samples = 4 * sfreq
+hop_samples = 2 * sfreq
+max_calibration_windows = 200
+benchmark_runs = 50
+
+# accuracy gate against fp32 on the evaluation windows, a variant has to pass both to be loaded
+min_agreement = 0.98        # fraction of windows with the same predicted class
+max_allowed_prob_diff = 0.05
+
+
+def load_windows():
+    """
+    CWT windows of all recorded cogload clips, split every other window into (calibration, evaluation)
+    """
+
+    windows = []
+    for path in sorted(glob.glob(f"{data_dir}/*.npy")):
+        clip = np.load(path)
+        for start in range(0, clip.shape[1] - window_samples + 1, hop_samples):
+            windows.append(cwt_spectrum(clip[:, start:start + window_samples]))
+
+    if len(windows) < 4:
+        raise Exception(f"need recorded clips in {data_dir} to calibrate on, found {len(windows)} windows")
+
+    windows = np.stack(windows)
+    return windows[::2][:max_calibration_windows], windows[1::2]
+
+
+def build_int8_dynamic(source, target, calibration):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    # weights only, activations are quantized on the fly - no calibration data needed
+    # this also covers the LSTMs (DynamicQuantizeLSTM), which is where the model spends its time
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+
+
+def build_int8_static(source, target, calibration):
+    from onnxruntime.quantization import quantize_static, CalibrationDataReader, QuantFormat, QuantType
+
+    class WindowReader(CalibrationDataReader):
+        def __init__(self, input_name, windows):
+            self.input_name = input_name
+            self.windows = iter(windows)
+
+        def get_next(self):
+            window = next(self.windows, None)
+            return None if window is None else {self.input_name: window[None]}
+
+    # QDQ only has kernels for the final Gemm here, the LSTMs stay in float - kept for comparison
+    input_name = OnnxModel(source).input_name
+    quantize_static(
+        source, target, WindowReader(input_name, calibration),
+        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True,
+    )
+
+
+def build_fp16(source, target, calibration):
+    import onnx
+    from onnxconverter_common import float16
+
+    # inputs and outputs stay float32, so the variant is a drop-in replacement
+    model = float16.convert_float_to_float16(onnx.load(source), keep_io_types=True)
+    onnx.save(model, target)
+
+
+builders = {
+    "int8_dynamic": build_int8_dynamic,
+    "int8_static": build_int8_static,
+    "fp16": build_fp16,
+}
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:     # linux only, resident pages are the second field
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def measure(path, windows, queue):
+    """
+    runs in a fresh process, so the memory difference only contains this one model (session + arena after running)
+    """
+
+    rss_before = rss_mb()
+    model = OnnxModel(path, providers=["CPUExecutionProvider"])
+    latency = model.benchmark(benchmark_runs)
+    probs = softmax(np.concatenate([model.run(window[None]) for window in windows]))[:, 1]
+    rss_after = rss_mb()
+
+    queue.put({
+        "load_time": model.load_time,
+        "latency_ms": latency,
+        "rss_mb": rss_after - rss_before,
+        "probs": probs,
+    })
+
+
+def measure_in_subprocess(path, windows):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(path, windows, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    variants = sys.argv[1:] or list(builders)
+    calibration, evaluation = load_windows()
+    print(f"{len(calibration)} calibration windows, {len(evaluation)} evaluation windows")
+
+    for variant in variants:
+        start = time.perf_counter()
+        builders[variant](onnx_path, variant_path(onnx_path, variant), calibration)
+        print(f"built {variant_path(onnx_path, variant)} in {time.perf_counter() - start:.1f}s")
+
+    # only the rebuilt variants (and fp32, the reference) are measured again, earlier entries are kept
+    report = {}
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+
+    reference = None
+    for variant in ["fp32"] + variants:
+        path = variant_path(onnx_path, variant)
+        result = measure_in_subprocess(path, evaluation)
+        probs = result.pop("probs")
+        if reference is None:
+            reference = probs
+
+        agreement = float(np.mean((probs > 0.5) == (reference > 0.5)))     # same predicted class as fp32
+        max_prob_diff = float(np.abs(probs - reference).max())
+        report[variant] = {
+            "path": path,
+            "size_mb": os.path.getsize(path) / 1024**2,
+            **result,
+            "agreement": agreement,
+            "max_prob_diff": max_prob_diff,
+            "min_agreement": min_agreement,
+            "max_allowed_prob_diff": max_allowed_prob_diff,
+            "passed": agreement >= min_agreement and max_prob_diff <= max_allowed_prob_diff,
+        }
+
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"{'variant':<14}{'size MB':>9}{'RSS MB':>9}{'p50 ms':>9}{'p99 ms':>9}{'agree':>8}{'max diff':>10}{'gate':>7}")
+    for variant, row in report.items():
+        print(f"{variant:<14}{row['size_mb']:>9.2f}{row['rss_mb']:>9.1f}{row['latency_ms']['p50']:>9.1f}"
+              f"{row['latency_ms']['p99']:>9.1f}{row['agreement']:>8.1%}{row['max_prob_diff']:>10.4f}"
+              f"{'pass' if row.get('passed') else 'FAIL':>7}")
+    print(f"gate: agreement >= {min_agreement:.0%} and max diff <= {max_allowed_prob_diff}")
+    print(f"report written to {report_path}")
@@ -0,0 +1,128 @@
+# --- feeds a recorded session through the live pipeline (chunk handler -> ring buffer -> downsampler -> both predictors)
+# python replay.py <session dir or name | .npy files...> [speed]     (speed: 1, 10, ... or 0 = as fast as possible, default 0)
+# sessions come from the recorder (collected_data/sessions), .npy files from calibration ((7, samples) at 128Hz, played back to back)
+# writes the prediction timeline and throughput numbers to replay_report.json
+import json
+import os
+import sys
+import time
+import numpy as np
+import main
+from _recorder import SessionReader
+
+
+sessions_dir = main.sessions_dir
+report_path = "./replay_report.json"
+chunk_seconds = 0.05    # what the LSL thread hands over per pull (its pull_timeout)
+
+
+def load_source(sources:list):
+    """
+    (samples of shape (n_samples, n_channels), unix timestamps, ch_names, sfreq) of a recorded session or calibration arrays
+    """
+
+    if len(sources) == 1 and not sources[0].endswith(".npy"):
+        path = sources[0] if os.path.isdir(sources[0]) else os.path.join(sessions_dir, sources[0])
+        reader = SessionReader(path)
+        samples, timestamps = reader.read()
+        return samples, timestamps, reader.ch_names, reader.sfreq
+
+    # calibration arrays only hold the expected channels at the expected sfreq, without timestamps
+    samples = np.concatenate([np.load(path).T for path in sources]).astype(np.float32)
+    timestamps = time.time() + np.arange(len(samples)) / main.expected_sfreq
+    return samples, timestamps, main.expected_channels, main.expected_sfreq
+
+
+def replay(samples:np.ndarray, timestamps:np.ndarray, ch_names:list, sfreq:float, speed:float=0,
+           focus_interval:float=main.focus_interval, cogload_interval:float=main.cogload_interval):
+    """
+    pushes the samples chunk by chunk through main.handle_eeg_chunk and runs the predictors whenever their interval
+    passed in stream time - the same code paths the scheduler runs live, without threads, so runs are repeatable
+    - speed 1 paces the chunks in real time, 10 ten times faster, 0 doesn't wait at all
+    returns (timeline of {"time", "model", "value", "latency_ms"}, stats)
+    """
+
+    main.setup_pipeline(ch_names, sfreq)
+    chunk_samples = max(int(sfreq * chunk_seconds), 1)
+    tasks = [("focus", main.infer_focus, focus_interval), ("cogload", main.infer_cogload, cogload_interval)]
+    next_due = {name: timestamps[0] + interval for name, _, interval in tasks}
+
+    timeline = []
+    ingest_time = 0.0
+    start = time.perf_counter()
+    for chunk_start in range(0, len(samples), chunk_samples):
+        chunk_timestamps = timestamps[chunk_start:chunk_start + chunk_samples]
+        now = chunk_timestamps[-1]
+
+        if speed > 0:
+            delay = (now - timestamps[0]) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        ingest_start = time.perf_counter()
+        main.handle_eeg_chunk(samples[chunk_start:chunk_start + chunk_samples], chunk_timestamps)
+        ingest_time += time.perf_counter() - ingest_start
+
+        for name, task, interval in tasks:
+            if now < next_due[name]:
+                continue
+            next_due[name] += interval * max(1, np.ceil((now - next_due[name]) / interval))
+
+            task_start = time.perf_counter()
+            value = task()
+            latency = (time.perf_counter() - task_start) * 1000
+            if value is not None:
+                timeline.append({"time": float(now - timestamps[0]), "model": name, "value": float(value), "latency_ms": latency})
+
+    wall_time = time.perf_counter() - start
+    duration = float(timestamps[-1] - timestamps[0]) + 1 / sfreq
+
+    latencies = {}
+    for name, _, _ in tasks:
+        model_latencies = [row["latency_ms"] for row in timeline if row["model"] == name]
+        if model_latencies:
+            latencies[name] = {
+                "n": len(model_latencies),
+                "mean": float(np.mean(model_latencies)),
+                "p50": float(np.percentile(model_latencies, 50)),
+                "p99": float(np.percentile(model_latencies, 99)),
+            }
+
+    stats = {
+        "samples": len(samples),
+        "duration_s": duration,
+        "wall_s": wall_time,
+        "speedup": duration / wall_time,
+        "samples_per_s": len(samples) / wall_time,
+        "ingest_samples_per_s": len(samples) / ingest_time if ingest_time else None,   # handle_eeg_chunk alone
+        "latency_ms": latencies,
+        "stream": main.glob_monitor.stats(),   # gaps, interpolated / dropped samples and jitter of the recording
+    }
+    return timeline, stats
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args:
+        print("usage: python replay.py <session dir or name | .npy files...> [speed]")
+        exit()
+
+    speed = 0
+    if len(args) > 1 and not args[-1].endswith(".npy"):
+        speed = float(args.pop())
+
+    samples, timestamps, ch_names, sfreq = load_source(args)
+    print(f"replaying {len(samples)} samples ({len(samples) / sfreq:.0f}s at {sfreq}Hz) at speed {speed or 'max'}")
+
+    # models are loaded up front, so the first predictions don't include loading them
+    main.warmup_models().join()
+    timeline, stats = replay(samples, timestamps, ch_names, sfreq, speed)
+
+    with open(report_path, "w") as f:
+        json.dump({"source": args, "speed": speed, **stats, "timeline": timeline}, f, indent=4)
+
+    print(f"{stats['duration_s']:.0f}s of data in {stats['wall_s']:.2f}s ({stats['speedup']:.1f}x real time, "
+          f"{stats['samples_per_s']:.0f} samples/s, handle_eeg_chunk alone {stats['ingest_samples_per_s']:.0f} samples/s)")
+    for name, latency in stats["latency_ms"].items():
+        print(f"{name:<10}{latency['n']:>6} predictions   p50 {latency['p50']:.1f}ms   p99 {latency['p99']:.1f}ms")
+    print(f"report written to {report_path}")
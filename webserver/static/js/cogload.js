@@ -7,20 +7,24 @@ let currentLoad = 0;
 let lastLoad = 0;
 let stepsSinceUIUpdate = 0;
 
-// Function to fetch data
-function fetchData() {
-    fetch('/data')
-        .then(response => response.json())
-        .then(data => {
-            console.log(data);
-            lastLoad = currentLoad;
-            // Ensure cogload is a number
-            currentLoad = parseFloat(data.cogload) || 0;
-            stepsSinceUIUpdate = 0;
-        })
-        .catch(error => {
-            console.error('Error fetching data:', error);
-        });
+let source = null;
+
+// Function to subscribe to pushed predictions
+function subscribe() {
+    // the server pushes a "cogload" event whenever a new prediction is ready (every 2 seconds by default)
+    source = new EventSource('/stream');
+    source.addEventListener('cogload', event => {
+        const data = JSON.parse(event.data);
+        console.log(data);
+        lastLoad = currentLoad;
+        // Ensure cogload is a number
+        currentLoad = parseFloat(data.value) || 0;
+        stepsSinceUIUpdate = 0;
+    });
+    source.onerror = error => {
+        // EventSource reconnects on its own
+        console.error('Error in prediction stream:', error);
+    };
 }
 
 // Function to update UI with smooth transitions
@@ -42,13 +46,13 @@ function updateUI() {
     playbackRateDisplay.textContent = playbackRate.toFixed(2);
 }
 
-// Start fetching data when video starts playing
+// Start receiving data when video starts playing
 video.addEventListener('play', () => {
-    // Set initial data fetch and UI update
-    fetchData();
+    // only subscribe once, play fires again after every pause
+    if (source) return;
+    
+    subscribe();
     updateUI();
     
-    // Set up intervals for data fetching and UI updates
-    setInterval(fetchData, 2000);  // Fetch data every 2 seconds
     setInterval(updateUI, 100);    // Update UI more frequently for smooth transitions
 }); 
\ No newline at end of file
@@ -2,16 +2,17 @@ document.addEventListener('DOMContentLoaded', function() {
     const bulb = document.querySelector('.bulb');
     const focusValue = document.getElementById('focus-value');
     
-    function fetchData() {
-        fetch('/data')
-            .then(response => response.json())
-            .then(data => {
-                const focus = parseFloat(data.focus);
-                updateBulb(focus);
-            })
-            .catch(error => {
-                console.error('Error fetching data:', error);
-            });
+    function subscribe() {
+        // the server pushes a "focus" event whenever a new prediction is ready
+        const source = new EventSource('/stream');
+        source.addEventListener('focus', event => {
+            const data = JSON.parse(event.data);
+            updateBulb(parseFloat(data.value));
+        });
+        source.onerror = error => {
+            // EventSource reconnects on its own
+            console.error('Error in prediction stream:', error);
+        };
     }
     
     function updateBulb(focus) {
@@ -31,9 +32,6 @@ document.addEventListener('DOMContentLoaded', function() {
         focusValue.textContent = `Focus: ${Math.round(brightness)}%`;
     }
     
-    // Initial fetch
-    fetchData();
-    
-    // Fetch every 500ms (half a second)
-    setInterval(fetchData, 500);
+    // Subscribe to pushed predictions instead of polling
+    subscribe();
 });
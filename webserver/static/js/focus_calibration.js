@@ -13,6 +13,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const timer = document.getElementById('timer');
     const unfocusProgress = document.getElementById('unfocusProgress');
     const unfocusTimer = document.getElementById('unfocusTimer');
+    const finetuneStatus = document.getElementById('finetuneStatus');
     
     // Configuration
     const focusDuration = 40; // seconds
@@ -155,6 +156,10 @@ document.addEventListener('DOMContentLoaded', function() {
             hideAllSections();
             results.classList.remove('hidden');
             isCalibrating = false;
+            
+            if (data.job) {
+                pollSaveJob(data.job);
+            }
         })
         .catch((error) => {
             console.error('Error sending calibration data:', error);
@@ -162,6 +167,53 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    function pollSaveJob(jobId) {
+        // the recording is saved in the background, finetuning starts once it is on disk
+        finetuneStatus.textContent = 'Saving your recording...';
+        
+        fetch(`/jobs/${jobId}`)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'done') {
+                pollFinetuneJob(job.result.finetune_job);
+            } else if (job.status === 'failed') {
+                finetuneStatus.textContent = `Saving failed: ${job.error}`;
+            } else {
+                setTimeout(() => pollSaveJob(jobId), 500);
+            }
+        })
+        .catch((error) => {
+            console.error('Error polling save job:', error);
+            finetuneStatus.textContent = 'Lost track of the save job.';
+        });
+    }
+    
+    function pollFinetuneJob(jobId) {
+        // finetuning runs in the background on the server, poll until it is done
+        finetuneStatus.textContent = 'Finetuning your model...';
+        
+        fetch(`/jobs/${jobId}`)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'done') {
+                const result = job.result;
+                const accuracy = (result.accuracy * 100).toFixed(0);
+                const baseline = (result.baseline_accuracy * 100).toFixed(0);
+                finetuneStatus.textContent = result.published_version
+                    ? `Your model is active (${accuracy}% accuracy, was ${baseline}%).`
+                    : `Kept the current model (${baseline}% accuracy, the finetuned one reached ${accuracy}%).`;
+            } else if (job.status === 'failed') {
+                finetuneStatus.textContent = `Finetuning failed: ${job.error}`;
+            } else {
+                setTimeout(() => pollFinetuneJob(jobId), 1000);
+            }
+        })
+        .catch((error) => {
+            console.error('Error polling finetuning job:', error);
+            finetuneStatus.textContent = 'Lost track of the finetuning job.';
+        });
+    }
+    
     function resetCalibration() {
         hideAllSections();
         instructions.classList.remove('hidden');
@@ -169,6 +221,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Reset progress bars
         progress.style.width = '0%';
         unfocusProgress.style.width = '0%';
+        finetuneStatus.textContent = '';
     }
     
     // Helper function to hide all sections